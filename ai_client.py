@@ -4,78 +4,127 @@ High-level AI client interface that supports multiple providers:
 - Anthropic (Claude models)
 - OpenRouter (Various models)
 - Grok (X.AI models)
+- Groq, local llama.cpp/vLLM servers and any other OpenAI-compatible API
+
+Providers are plugins (see providers.py); models and extra providers are configured
+in models.json.
 """
 
 import os
-import requests
 import json
-from typing import Dict, List, Any, Optional
-from openai import OpenAI
-import anthropic
-from dotenv import load_dotenv
+import time
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Generator
+from import_timing import lazy_import
+from providers import AIResponse, Provider, OpenAIProvider, AnthropicProvider, OpenAICompatibleProvider, provider_from_config
+from model_catalog import ModelCatalog
+
+# Provider SDKs (openai, anthropic, requests) are imported on first use, so e.g. a
+# Groq-only deployment never pays for the OpenAI or Anthropic SDKs. dotenv is loaded
+# when a client is created, before it reads any settings.
+
+# Model and provider configuration (override the path with AI_MODELS_FILE)
+DEFAULT_MODELS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models.json")
+
+# Disk cache of fetched provider model lists (MODEL_CATALOG_CACHE), and how long they stay
+# fresh (MODEL_CATALOG_TTL seconds)
+DEFAULT_MODEL_CATALOG_CACHE = "model_catalog_cache.json"
+DEFAULT_MODEL_CATALOG_TTL = 24 * 3600
+
+# Seconds a failed provider is treated as unhealthy before being tried again
+UNHEALTHY_RETRY_AFTER = 30.0
 
-# Ensure environment variables are loaded
-load_dotenv()
+_env_loaded = False
 
-class AIResponse:
-    """Standardized response format across all providers"""
-    def __init__(self, content: str, model: str, provider: str, tokens_used: Optional[int] = None):
-        self.content = content
-        self.model = model
-        self.provider = provider
-        self.tokens_used = tokens_used
+def load_env():
+    """Load environment variables from .env once, on first use rather than at import"""
+    global _env_loaded
+    if not _env_loaded:
+        lazy_import("dotenv").load_dotenv()
+        _env_loaded = True
+
+def default_providers() -> List[Provider]:
+    """Built-in providers; models.json can add more or replace these by name"""
+    return [
+        OpenAIProvider(),
+        AnthropicProvider(),
+        OpenAICompatibleProvider(
+            "openrouter",
+            "https://openrouter.ai/api/v1",
+            api_key_env="OPENROUTER_API_KEY",
+            headers={"HTTP-Referer": "https://github.com/your-repo", "X-Title": "Discord AI Bot"},
+            probe_path="/key"
+        ),
+        OpenAICompatibleProvider("groq", "https://api.groq.com/openai/v1", api_key_env="GROQ_API_KEY")
+    ]
+
+class CompletionCancelled(Exception):
+    """Raised when a cancellable completion is aborted"""
 
 class UniversalAIClient:
     """Universal AI client that works with multiple providers"""
     
-    def __init__(self):
-        # Initialize clients for different providers
-        self.openai_client = None
-        self.anthropic_client = None
-        # Don't setup clients immediately - do it on first use to ensure env vars are loaded
-        
-        # Model mappings
-        self.model_mappings = {
-            # OpenAI models
-            "gpt-4o": {"provider": "openai", "model": "gpt-4o"},
-            "gpt-4o-mini": {"provider": "openai", "model": "gpt-4o-mini"},
-            "gpt-4": {"provider": "openai", "model": "gpt-4"},
-            "gpt-3.5-turbo": {"provider": "openai", "model": "gpt-3.5-turbo"},
-            
-            # Anthropic models
-            "claude-3.5-sonnet": {"provider": "anthropic", "model": "claude-3-5-sonnet-20241022"},
-            "claude-3-opus": {"provider": "anthropic", "model": "claude-3-opus-20240229"},
-            "claude-3-haiku": {"provider": "anthropic", "model": "claude-3-haiku-20240307"},
-            
-            # OpenRouter models
-            "gpt-oss-120b": {"provider": "openrouter", "model": "openai/gpt-oss-120b"},
-            "horizon-beta": {"provider": "openrouter", "model": "openrouter/horizon-beta"},
-            "claude-opus-4.1": {"provider": "openrouter", "model": "anthropic/claude-opus-4.1"},
-            "llama-3.1-70b": {"provider": "openrouter", "model": "meta-llama/llama-3.1-70b-instruct"},
-            "mixtral-8x7b": {"provider": "openrouter", "model": "mistralai/mixtral-8x7b-instruct"},
-            "gemini-pro": {"provider": "openrouter", "model": "google/gemini-pro"},
-            
-            # Groq models
-            "llama-3.1-8b-groq": {"provider": "groq", "model": "llama-3.1-8b-instant"},
-            "llama-3.1-70b-groq": {"provider": "groq", "model": "llama-3.1-70b-versatile"},
-            "llama-3.2-1b-groq": {"provider": "groq", "model": "llama-3.2-1b-preview"},
-            "llama-3.2-3b-groq": {"provider": "groq", "model": "llama-3.2-3b-preview"},
-            "mixtral-8x7b-groq": {"provider": "groq", "model": "mixtral-8x7b-32768"},
-            "gemma-7b-groq": {"provider": "groq", "model": "gemma-7b-it"},
-            
-            # Grok models (via OpenRouter for now)
-            "grok-beta": {"provider": "openrouter", "model": "x-ai/grok-beta"},
-        }
+    def __init__(self, config_path: Optional[str] = None):
+        """config_path defaults to AI_MODELS_FILE or the bundled models.json ("" loads none)"""
+        # Settings may come from .env, so load it before reading any
+        load_env()
+        if config_path is None:
+            config_path = os.getenv("AI_MODELS_FILE", DEFAULT_MODELS_FILE)
+        
+        # Provider plugins by name; SDK clients and sessions are created on first use
+        self.providers: Dict[str, Provider] = {}
+        for provider in default_providers():
+            self.register_provider(provider)
+        
+        # Routing state: provider -> {"healthy", "latency", "checked_at", "error"}
+        self.provider_health = {}
+        
+        # Optional traffic.TrafficRecorder capturing every request/response pair
+        self.recorder = None
+        
+        # Model name -> {"provider", "model"}
+        self.model_mappings: Dict[str, Dict[str, str]] = {}
+        if config_path and os.path.exists(config_path):
+            self.load_config(config_path)
+        
+        # Context length, pricing and availability per model (refreshed with catalog.refresh())
+        self.catalog = ModelCatalog(
+            self,
+            cache_path=os.getenv("MODEL_CATALOG_CACHE", DEFAULT_MODEL_CATALOG_CACHE),
+            ttl=float(os.getenv("MODEL_CATALOG_TTL", str(DEFAULT_MODEL_CATALOG_TTL)))
+        )
+    
+    def register_provider(self, provider: Provider):
+        """Add a provider plugin, replacing any provider with the same name"""
+        self.providers[provider.name] = provider
+    
+    def load_config(self, path: str):
+        """Load extra providers and model mappings from a JSON file.
+        
+        Format: {"providers": {name: {"type": ..., ...}}, "models": {name: {"provider", "model"}}}
+        """
+        with open(path, 'r') as f:
+            config = json.load(f)
+        
+        for name, provider_config in config.get("providers", {}).items():
+            self.register_provider(provider_from_config(name, provider_config))
+        
+        for name, mapping in config.get("models", {}).items():
+            if mapping.get("provider") not in self.providers:
+                raise ValueError(f"Model '{name}' in {path} uses unknown provider '{mapping.get('provider')}'")
+            self.model_mappings[name] = {"provider": mapping["provider"], "model": mapping["model"]}
+    
+    def configured_providers(self) -> List[str]:
+        """Providers that have an API key (or, for local servers, a base URL) configured"""
+        load_env()
+        return [name for name, provider in self.providers.items() if provider.is_configured()]
     
     def get_available_models(self) -> Dict[str, List[str]]:
         """Get list of available models grouped by provider"""
-        models = {
-            "openai": [],
-            "anthropic": [],
-            "openrouter": [],
-            "groq": [],
-            "grok": []
-        }
+        models = {name: [] for name in self.providers}
+        models["grok"] = []
         
         for model_name, config in self.model_mappings.items():
             provider = config["provider"]
@@ -86,6 +135,14 @@ class UniversalAIClient:
         
         return models
     
+    def _resolve(self, model: str):
+        """(provider name, provider plugin, provider-side model id) for a model name"""
+        if model not in self.model_mappings:
+            raise ValueError(f"Model '{model}' not supported. Available models: {list(self.model_mappings.keys())}")
+        
+        config = self.model_mappings[model]
+        return config["provider"], self.providers[config["provider"]], config["model"]
+    
     def chat_completion(self, 
                        model: str, 
                        messages: List[Dict[str, str]], 
@@ -93,148 +150,339 @@ class UniversalAIClient:
                        max_tokens: int = 500) -> AIResponse:
         """Universal chat completion method"""
         
-        if model not in self.model_mappings:
-            raise ValueError(f"Model '{model}' not supported. Available models: {list(self.model_mappings.keys())}")
-        
-        config = self.model_mappings[model]
-        provider = config["provider"]
-        actual_model = config["model"]
+        provider, plugin, actual_model = self._resolve(model)
+        load_env()
+        start = time.perf_counter()
         
         try:
-            if provider == "openai":
-                return self._openai_completion(actual_model, messages, temperature, max_tokens)
-            elif provider == "anthropic":
-                return self._anthropic_completion(actual_model, messages, temperature, max_tokens)
-            elif provider == "openrouter":
-                return self._openrouter_completion(actual_model, messages, temperature, max_tokens)
-            elif provider == "groq":
-                return self._groq_completion(actual_model, messages, temperature, max_tokens)
-            else:
-                raise ValueError(f"Provider '{provider}' not implemented")
-        
+            response = plugin.complete(actual_model, messages, temperature, max_tokens)
         except Exception as e:
+            self._record_health(provider, False, time.perf_counter() - start, str(e))
+            if self.recorder:
+                self.recorder.completion(model, messages, max_tokens, time.perf_counter() - start, error=str(e))
             raise Exception(f"Error with {provider} ({model}): {str(e)}")
+        
+        # Every real request also refreshes the routing state
+        self._record_health(provider, True, time.perf_counter() - start)
+        if self.recorder:
+            self.recorder.completion(model, messages, max_tokens, time.perf_counter() - start, response=response)
+        return response
     
-    def _openai_completion(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> AIResponse:
-        """Handle OpenAI API calls"""
-        # Initialize OpenAI client if not already done
-        if not self.openai_client:
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                raise Exception("OpenAI API key not configured")
-            self.openai_client = OpenAI(api_key=api_key)
-        
-        response = self.openai_client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
+    def stream_completion(self,
+                          model: str,
+                          messages: List[Dict[str, str]],
+                          temperature: float = 0.7,
+                          max_tokens: int = 500) -> Generator[str, None, AIResponse]:
+        """Streaming chat completion, yielding text deltas as they arrive.
         
-        content = response.choices[0].message.content
-        tokens_used = response.usage.total_tokens if response.usage else None
+        When exhausted the generator returns the full AIResponse (StopIteration.value,
+        or the result of `yield from`). Closing it early (e.g. on cancellation) closes
+        the underlying stream, which aborts the request upstream.
+        """
+        provider, plugin, actual_model = self._resolve(model)
+        load_env()
+        start = time.perf_counter()
+        first_token = None
         
-        return AIResponse(content, model, "openai", tokens_used)
-    
-    def _anthropic_completion(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> AIResponse:
-        """Handle Anthropic Claude API calls"""
-        # Initialize Anthropic client if not already done
-        if not self.anthropic_client:
-            api_key = os.getenv("ANTHROPIC_API_KEY")
-            if not api_key:
-                raise Exception("Anthropic API key not configured")
-            self.anthropic_client = anthropic.Anthropic(api_key=api_key)
-        
-        # Convert OpenAI format to Anthropic format
-        system_message = ""
-        user_messages = []
-        
-        for msg in messages:
-            if msg["role"] == "system":
-                system_message = msg["content"]
-            else:
-                user_messages.append(msg)
-        
-        response = self.anthropic_client.messages.create(
-            model=model,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            system=system_message,
-            messages=user_messages
-        )
+        stream = plugin.stream(actual_model, messages, temperature, max_tokens)
+        try:
+            while True:
+                try:
+                    delta = next(stream)
+                except StopIteration as done:
+                    response = done.value
+                    break
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                yield delta
+        except GeneratorExit:
+            raise
+        except Exception as e:
+            self._record_health(provider, False, time.perf_counter() - start, str(e))
+            if self.recorder:
+                self.recorder.completion(model, messages, max_tokens, time.perf_counter() - start, first_token, error=str(e))
+            raise Exception(f"Error with {provider} ({model}): {str(e)}")
+        finally:
+            stream.close()
         
-        content = response.content[0].text
-        tokens_used = response.usage.input_tokens + response.usage.output_tokens
+        self._record_health(provider, True, time.perf_counter() - start)
+        if self.recorder:
+            self.recorder.completion(model, messages, max_tokens, time.perf_counter() - start, first_token, response=response)
+        return response
+    
+    def cancellable_completion(self,
+                               model: str,
+                               messages: List[Dict[str, str]],
+                               temperature: float,
+                               max_tokens: int,
+                               cancel_event: threading.Event) -> AIResponse:
+        """Chat completion that aborts the upstream stream as soon as cancel_event is set.
         
-        return AIResponse(content, model, "anthropic", tokens_used)
+        Meant to run in a worker thread; raises CompletionCancelled when aborted.
+        """
+        stream = self.stream_completion(model, messages, temperature, max_tokens)
+        try:
+            while True:
+                if cancel_event.is_set():
+                    raise CompletionCancelled(f"Completion for {model} cancelled")
+                try:
+                    next(stream)
+                except StopIteration as done:
+                    return done.value
+        finally:
+            stream.close()
     
-    def _openrouter_completion(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> AIResponse:
-        """Handle OpenRouter API calls"""
-        api_key = os.getenv("OPENROUTER_API_KEY")
-        if not api_key:
-            raise Exception("OpenRouter API key not configured")
-        
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://github.com/your-repo",
-            "X-Title": "Discord AI Bot"
+    def _record_health(self, provider: str, healthy: bool, latency: Optional[float], error: Optional[str] = None):
+        """Update routing state for a provider"""
+        self.provider_health[provider] = {
+            "healthy": healthy,
+            "latency": latency,
+            "checked_at": time.time(),
+            "error": error
         }
+    
+    def is_healthy(self, provider: str) -> bool:
+        """Whether a provider is usable, as far as we know (unchecked providers count as healthy).
         
-        data = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens
-        }
+        A failure only counts for UNHEALTHY_RETRY_AFTER seconds, so traffic routed away
+        from a provider comes back to it once the failure is stale.
+        """
+        health = self.provider_health.get(provider)
+        if health is None or health["healthy"]:
+            return True
+        return time.time() - health["checked_at"] > UNHEALTHY_RETRY_AFTER
+    
+    def warm_up(self, providers: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Construct clients, pre-open connections and health-check providers in parallel.
         
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            data=json.dumps(data)
-        )
+        Defaults to every configured provider. Returns the updated provider_health entries.
+        """
+        load_env()
+        if providers is None:
+            providers = self.configured_providers()
         
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API error: {response.status_code} - {response.text}")
+        def check(provider):
+            start = time.perf_counter()
+            try:
+                self.providers[provider].probe()
+                self._record_health(provider, True, time.perf_counter() - start)
+            except Exception as e:
+                self._record_health(provider, False, time.perf_counter() - start, str(e))
         
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
-        tokens_used = result.get("usage", {}).get("total_tokens")
+        if providers:
+            with ThreadPoolExecutor(max_workers=len(providers)) as executor:
+                list(executor.map(check, providers))
+        return {provider: self.provider_health[provider] for provider in providers}
+
+    def batch_completion(self,
+                         batch_requests: List[Dict[str, Any]],
+                         output_path: str,
+                         max_workers: int = 4,
+                         use_batch_api: bool = True,
+                         poll_interval: float = 30.0) -> str:
+        """Run many chat completions offline, streaming results to a JSONL file.
         
-        return AIResponse(content, model, "openrouter", tokens_used)
-    
-    def _groq_completion(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> AIResponse:
-        """Handle Groq API calls"""
-        api_key = os.getenv("GROQ_API_KEY")
-        if not api_key:
-            raise Exception("Groq API key not configured")
-        
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        Each request is a dict with a unique "custom_id" (letters, digits, "_" or "-";
+        defaults to its index), "model", "messages" and optional "temperature"/"max_tokens".
+        Models on providers with a batch API (OpenAI, Anthropic) go through their batch
+        endpoints (cheaper, slower) when use_batch_api is set; everything else runs on
+        a bounded worker pool.
         
-        data = {
-            "model": model,
-            "messages": messages,
-            "temperature": temperature,
-            "max_tokens": max_tokens
-        }
+        The output file doubles as the checkpoint: rerunning with the same output_path
+        skips requests already answered, retries failed ones (the last line for a
+        custom_id wins) and resumes submitted batches instead of resubmitting their
+        requests or running them on the pool. Returns output_path.
+        """
+        load_env()
+        checkpoint_path = output_path + ".checkpoint.json"
         
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            data=json.dumps(data)
-        )
+        # Results are matched to requests by custom_id, so each must be unique
+        custom_ids = [str(req.get("custom_id", index)) for index, req in enumerate(batch_requests)]
+        duplicates = sorted(custom_id for custom_id, count in Counter(custom_ids).items() if count > 1)
+        if duplicates:
+            raise ValueError(f"Duplicate custom_id values: {duplicates}")
         
-        if response.status_code != 200:
-            raise Exception(f"Groq API error: {response.status_code} - {response.text}")
+        # Requests already answered by a previous run (failed ones are retried)
+        done = set()
+        if os.path.exists(output_path):
+            with open(output_path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        result = json.loads(line)
+                        if "error" not in result:
+                            done.add(result["custom_id"])
         
-        result = response.json()
-        content = result["choices"][0]["message"]["content"]
-        tokens_used = result.get("usage", {}).get("total_tokens")
+        checkpoint = {"batches": {}}
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r') as f:
+                checkpoint = json.load(f)
         
-        return AIResponse(content, model, "groq", tokens_used)
+        # Requests in batches submitted by a previous run are collected from there, even
+        # if this run would send them to the pool
+        submitted = {custom_id for batch in checkpoint["batches"].values() for custom_id in batch["models"]}
+        
+        # Group pending requests by how they will be run
+        pending = {"pool": []}
+        for custom_id, req in zip(custom_ids, batch_requests):
+            req = dict(req, custom_id=custom_id)
+            if custom_id in done or custom_id in submitted:
+                continue
+            if req["model"] not in self.model_mappings:
+                raise ValueError(f"Model '{req['model']}' not supported. Available models: {list(self.model_mappings.keys())}")
+            provider = self.model_mappings[req["model"]]["provider"]
+            if use_batch_api and self.providers[provider].batch_api:
+                pending.setdefault(provider, []).append(req)
+            else:
+                pending["pool"].append(req)
+        
+        write_lock = threading.Lock()
+        
+        with open(output_path, 'a') as out:
+            def write_result(result: Dict[str, Any]):
+                with write_lock:
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+            
+            # Submit (or resume) provider batches first so they run while the pool works
+            for provider in [name for name in pending if name != "pool"]:
+                if provider in checkpoint["batches"]:
+                    # Already submitted; requests added since then run on the pool
+                    pending["pool"].extend(pending[provider])
+                elif pending[provider]:
+                    checkpoint["batches"][provider] = self._submit_batch(provider, pending[provider])
+                    self._write_checkpoint(checkpoint_path, checkpoint)
+            
+            def run_one(req: Dict[str, Any]):
+                result = {"custom_id": req["custom_id"], "model": req["model"]}
+                try:
+                    response = self.chat_completion(
+                        model=req["model"],
+                        messages=req["messages"],
+                        temperature=req.get("temperature", 0.7),
+                        max_tokens=req.get("max_tokens", 500)
+                    )
+                    result.update(content=response.content, provider=response.provider, tokens_used=response.tokens_used)
+                except Exception as e:
+                    result["error"] = str(e)
+                write_result(result)
+            
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(run_one, pending["pool"]))
+            
+            # Wait for provider batches and stream their results
+            for provider, batch in list(checkpoint["batches"].items()):
+                for result in self._collect_batch(provider, batch, poll_interval):
+                    if result["custom_id"] not in done:
+                        write_result(result)
+                del checkpoint["batches"][provider]
+                self._write_checkpoint(checkpoint_path, checkpoint)
+        
+        if os.path.exists(checkpoint_path) and not checkpoint["batches"]:
+            os.remove(checkpoint_path)
+        return output_path
+    
+    def _write_checkpoint(self, checkpoint_path: str, checkpoint: Dict[str, Any]):
+        """Atomically replace the batch checkpoint file"""
+        tmp_path = checkpoint_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, checkpoint_path)
+    
+    def _submit_batch(self, provider: str, batch_requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Submit requests to a provider batch endpoint, returning checkpoint info"""
+        models = {req["custom_id"]: req["model"] for req in batch_requests}
+        plugin = self.providers[provider]
+        
+        if plugin.batch_api == "openai":
+            lines = []
+            for req in batch_requests:
+                lines.append(json.dumps({
+                    "custom_id": req["custom_id"],
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": self.model_mappings[req["model"]]["model"],
+                        "messages": req["messages"],
+                        "temperature": req.get("temperature", 0.7),
+                        "max_tokens": req.get("max_tokens", 500)
+                    }
+                }))
+            client = plugin.client()
+            input_file = client.files.create(file=("batch.jsonl", "\n".join(lines).encode()), purpose="batch")
+            batch = client.batches.create(
+                input_file_id=input_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+        else:
+            anthropic_requests = []
+            for req in batch_requests:
+                system_message, user_messages = plugin.convert_messages(req["messages"])
+                anthropic_requests.append({
+                    "custom_id": req["custom_id"],
+                    "params": {
+                        "model": self.model_mappings[req["model"]]["model"],
+                        "max_tokens": req.get("max_tokens", 500),
+                        "temperature": req.get("temperature", 0.7),
+                        "system": system_message,
+                        "messages": user_messages
+                    }
+                })
+            batch = plugin.client().messages.batches.create(requests=anthropic_requests)
+        
+        return {"id": batch.id, "models": models}
+    
+    def _collect_batch(self, provider: str, batch: Dict[str, Any], poll_interval: float):
+        """Poll a provider batch until it finishes, then yield one result dict per request"""
+        models = batch["models"]
+        plugin = self.providers[provider]
+        
+        if plugin.batch_api == "openai":
+            client = plugin.client()
+            while True:
+                status = client.batches.retrieve(batch["id"])
+                if status.status in ("completed", "failed", "expired", "cancelled"):
+                    break
+                time.sleep(poll_interval)
+            
+            seen = set()
+            for file_id in (status.output_file_id, status.error_file_id):
+                if not file_id:
+                    continue
+                for line in client.files.content(file_id).text.splitlines():
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    custom_id = entry["custom_id"]
+                    seen.add(custom_id)
+                    result = {"custom_id": custom_id, "model": models.get(custom_id), "provider": provider}
+                    response = entry.get("response") or {}
+                    if response.get("status_code") == 200:
+                        body = response["body"]
+                        result["content"] = body["choices"][0]["message"]["content"]
+                        result["tokens_used"] = body.get("usage", {}).get("total_tokens")
+                    else:
+                        result["error"] = json.dumps(entry.get("error") or response.get("body"))
+                    yield result
+            
+            # Requests dropped by a failed or expired batch
+            for custom_id in models:
+                if custom_id not in seen:
+                    yield {"custom_id": custom_id, "model": models[custom_id], "provider": provider, "error": f"Batch {status.status}"}
+        else:
+            client = plugin.client()
+            while client.messages.batches.retrieve(batch["id"]).processing_status != "ended":
+                time.sleep(poll_interval)
+            
+            for entry in client.messages.batches.results(batch["id"]):
+                result = {"custom_id": entry.custom_id, "model": models.get(entry.custom_id), "provider": provider}
+                if entry.result.type == "succeeded":
+                    message = entry.result.message
+                    result["content"] = message.content[0].text
+                    result["tokens_used"] = message.usage.input_tokens + message.usage.output_tokens
+                else:
+                    result["error"] = entry.result.type
+                yield result
 
 # Global AI client instance
 ai_client = UniversalAIClient()
\ No newline at end of file
@@ -1,7 +1,14 @@
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS, cross_origin
 from openai import OpenAI
+from itsdangerous import BadSignature, URLSafeSerializer
+import hashlib
 import os
+import secrets
+import signal
+import threading
+import time
+from werkzeug.serving import make_server
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -22,8 +29,41 @@ client = OpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),
 )
 
-# Store chat history (in-memory, for demo purposes)
-chat_history = {}
+# Conversations live in the browser as a signed token (compressed history + HMAC),
+# so any worker can serve any request. Workers must share CHAT_SIGNING_KEY.
+signing_key = os.getenv("CHAT_SIGNING_KEY")
+if not signing_key:
+    signing_key = secrets.token_hex(32)
+    print("CHAT_SIGNING_KEY is not set; using a per-process key (conversations reset on restart "
+          "and can't be shared between workers)")
+history_serializer = URLSafeSerializer(signing_key, salt="chat-history",
+                                       signer_kwargs={"digest_method": hashlib.sha256})
+
+# Most user/assistant messages kept in a token (the system prompt is always kept)
+MAX_HISTORY_MESSAGES = int(os.getenv("CHAT_HISTORY_LIMIT", "40"))
+
+def load_history(token, prompt):
+    """Verify and unpack a history token; a missing token starts a new conversation"""
+    if not token:
+        return [{"role": "system", "content": prompt}]
+    if not isinstance(token, str):
+        raise BadSignature("History token must be a string")
+    history = history_serializer.loads(token)
+    if not isinstance(history, list):
+        raise BadSignature("History token does not hold a message list")
+    return history
+
+def dump_history(history):
+    system, messages = history[:1], history[1:]
+    return history_serializer.dumps(system + messages[-MAX_HISTORY_MESSAGES:])
+
+# Graceful shutdown: on SIGTERM/SIGINT new chats get a 503 while requests already talking to
+# the model get up to SHUTDOWN_DEADLINE seconds to finish. No state is lost either way, since
+# conversations live in the browser.
+SHUTDOWN_DEADLINE = float(os.getenv("SHUTDOWN_DEADLINE", "20"))
+draining = threading.Event()
+in_flight = 0
+in_flight_lock = threading.Lock()
 
 @app.route('/')
 def home():
@@ -31,23 +71,36 @@ def home():
 
 @app.route('/chat', methods=['POST'])
 def chat():
-    data = request.json
+    global in_flight
+    if draining.is_set():
+        response = jsonify({'error': 'The server is restarting, please send your message again in a moment'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    with in_flight_lock:
+        in_flight += 1
+    try:
+        return answer(request.json)
+    finally:
+        with in_flight_lock:
+            in_flight -= 1
+
+def answer(data):
     user_message = data.get('message', '')
     prompt = data.get('prompt', 'You are a helpful assistant.')
-    chat_id = data.get('chat_id', 'default')
-    
-    # Initialize chat history for this chat_id if it doesn't exist
-    if chat_id not in chat_history:
-        chat_history[chat_id] = [{"role": "system", "content": prompt}]
+
+    try:
+        history = load_history(data.get('history'), prompt)
+    except BadSignature:
+        return jsonify({'error': 'Conversation history was modified or signed with another key; start a new chat'}), 400
     
     # Add user message to history
-    chat_history[chat_id].append({"role": "user", "content": user_message})
+    history.append({"role": "user", "content": user_message})
     
     try:
         # Get response from OpenAI
         response = client.chat.completions.create(
             model="gpt-4o",
-            messages=chat_history[chat_id],
+            messages=history,
             max_tokens=1000,
             temperature=0.7
         )
@@ -56,15 +109,47 @@ def chat():
         assistant_message = response.choices[0].message.content
         
         # Add assistant's response to history
-        chat_history[chat_id].append({"role": "assistant", "content": assistant_message})
+        history.append({"role": "assistant", "content": assistant_message})
         
         return jsonify({
             'response': assistant_message,
-            'chat_id': chat_id
+            'history': dump_history(history)
         })
     except Exception as e:
         print(e)
         return jsonify({'error': str(e)}), 500
 
+def serve(host='127.0.0.1', port=5001):
+    """Run the threaded server until SIGTERM/SIGINT, then drain in-flight chats before exiting"""
+    server = make_server(host, port, app, threaded=True)
+    
+    def drain():
+        # Keep serving meanwhile, so new chats get a 503 instead of waiting in the backlog
+        deadline = time.monotonic() + SHUTDOWN_DEADLINE
+        while in_flight and time.monotonic() < deadline:
+            time.sleep(0.1)
+        server.shutdown()
+    
+    def stop(signum, frame):
+        if draining.is_set():
+            return
+        draining.set()
+        print(f"{signal.Signals(signum).name} received, draining {in_flight} in-flight request(s)")
+        # shutdown() blocks until serve_forever() returns, so it can't run in the handler
+        threading.Thread(target=drain).start()
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Serving on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+    print(f"Stopped ({in_flight} request(s) cut off)")
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
+    if os.getenv("FLASK_DEBUG") == "1":
+        # Development: debugger and auto-reload, no draining
+        app.run(debug=True, port=5001)
+    else:
+        serve()
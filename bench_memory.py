@@ -0,0 +1,68 @@
+"""
+Benchmark the long-term memory index (memory.py): size on disk, insert rate and
+query latency as a channel's index grows.
+
+Synthetic exchanges are drawn from a fixed vocabulary, so results are repeatable.
+
+Usage:
+    python bench_memory.py [--sizes 10000,100000,1000000] [--dim 256] [--queries 50]
+"""
+
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from memory import LongTermMemory
+
+# Exchanges embedded and written per add() call while building the index
+BUILD_BATCH = 10000
+
+def synthetic_texts(rng, vocabulary, count):
+    return [
+        "User: " + " ".join(rng.choices(vocabulary, k=rng.randint(5, 25))) +
+        "\nAssistant: " + " ".join(rng.choices(vocabulary, k=rng.randint(20, 60)))
+        for _ in range(count)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark long-term memory index size and query time")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated index sizes to measure")
+    parser.add_argument("--dim", type=int, default=256, help="Vector dimensions")
+    parser.add_argument("--queries", type=int, default=50, help="Queries timed at each size")
+    parser.add_argument("--top-k", type=int, default=3, help="Snippets recalled per query")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary = [f"word{i}" for i in range(20000)]
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+    directory = tempfile.mkdtemp(prefix="bench_memory_")
+    try:
+        memory = LongTermMemory(directory, dim=args.dim)
+        stored = 0
+        build_seconds = 0.0
+        print(f"{'entries':>10} {'disk MB':>9} {'insert/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for size in sizes:
+            while stored < size:
+                texts = synthetic_texts(rng, vocabulary, min(BUILD_BATCH, size - stored))
+                start = time.perf_counter()
+                memory.add("bench", texts)
+                build_seconds += time.perf_counter() - start
+                stored += len(texts)
+
+            latencies = []
+            for query in synthetic_texts(rng, vocabulary, args.queries):
+                start = time.perf_counter()
+                memory.recall("bench", query, k=args.top_k)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            stats = memory.stats("bench")
+            print(f"{stats['entries']:>10} {stats['bytes'] / 1e6:>9.1f} {stored / build_seconds:>9.0f} "
+                  f"{latencies[len(latencies) // 2] * 1000:>8.2f} "
+                  f"{latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:>8.2f}")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    main()
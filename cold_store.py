@@ -0,0 +1,200 @@
+"""
+Idle eviction of per-channel state to compressed cold storage.
+
+TieredDict behaves like the plain dicts the bot keeps conversations in, but entries
+not touched for a while can be evicted: they are serialized to JSON, compressed
+with zlib and kept either in memory or as one file per key on disk. Reading an
+evicted key rehydrates it transparently, so memory use follows the channels that
+are active rather than every channel ever seen.
+
+Values must be JSON-serializable. Keys are ints or strings (channel IDs and
+"channel/character" ensemble keys).
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import quote, unquote
+
+
+def deep_size(value: Any) -> int:
+    """Approximate bytes held by a value, counting nested lists, dicts and strings"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(deep_size(k) + deep_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(deep_size(item) for item in value)
+    return size
+
+
+class DiskBlobs(MutableMapping):
+    """Compressed blobs stored one file per key in a directory (kept across restarts)"""
+
+    SUFFIX = ".z"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: Any) -> str:
+        return os.path.join(self.directory, quote(json.dumps(key), safe="") + self.SUFFIX)
+
+    def __getitem__(self, key: Any) -> bytes:
+        try:
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: Any, blob: bytes):
+        path = self.path(key)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(blob)
+        os.replace(path + ".tmp", path)
+
+    def __delitem__(self, key: Any):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key: Any) -> bool:
+        return os.path.exists(self.path(key))
+
+    def __iter__(self) -> Iterator[Any]:
+        names = [name for name in os.listdir(self.directory) if name.endswith(self.SUFFIX)]
+        return iter([json.loads(unquote(name[:-len(self.SUFFIX)])) for name in names])
+
+    def __len__(self) -> int:
+        return sum(1 for name in os.listdir(self.directory) if name.endswith(self.SUFFIX))
+
+    def size(self, key: Any) -> int:
+        return os.path.getsize(self.path(key))
+
+
+class TieredDict(MutableMapping):
+    """Dict whose idle entries can be evicted to compressed cold storage.
+
+    Hot values are returned as the live objects, so in-place edits work as with a
+    plain dict. Evicted values come back as fresh copies on first access. Which keys
+    are cold (and their compressed sizes) is indexed in memory, so membership checks
+    and usage() never touch the disk; only rehydrating an evicted key reads it back.
+
+    evict_idle(), rehydrate() and usage() may run in worker threads while the event
+    loop uses the dict. The lock only guards the in-memory index: blobs are read,
+    written and removed outside it, so the loop never waits on another thread's I/O.
+    """
+
+    def __init__(self, directory: Optional[str] = None, level: int = 6):
+        self.hot: Dict[Any, Any] = {}
+        self.last_used: Dict[Any, float] = {}
+        self.cold = DiskBlobs(directory) if directory else {}
+        self.cold_sizes: Dict[Any, int] = {}  # cold key -> compressed bytes
+        if directory:
+            self.cold_sizes = {key: self.cold.size(key) for key in self.cold}
+        self.level = level
+        self.lock = threading.Lock()
+        self.evicting = threading.Lock()  # one evict_idle() at a time
+
+    def _drop_blob(self, key: Any):
+        try:
+            del self.cold[key]
+        except KeyError:
+            pass
+
+    def rehydrate(self, key: Any) -> bool:
+        """Bring an evicted key back into memory; returns False if it isn't cold (safe from any thread)"""
+        with self.lock:
+            if key not in self.cold_sizes:
+                return False
+        try:
+            value = json.loads(zlib.decompress(self.cold[key]))
+        except KeyError:
+            # Another thread rehydrated or replaced it first (they unindex before removing
+            # the blob); a blob missing while still indexed is gone for good
+            with self.lock:
+                self.cold_sizes.pop(key, None)
+            return False
+        with self.lock:
+            if key not in self.cold_sizes:
+                return False
+            del self.cold_sizes[key]
+            self.hot[key] = value
+            self.last_used[key] = time.monotonic()
+        # Just used, so not idle: nothing writes this blob again before it is removed
+        self._drop_blob(key)
+        return True
+
+    def __getitem__(self, key: Any) -> Any:
+        while True:
+            with self.lock:
+                if key in self.hot:
+                    self.last_used[key] = time.monotonic()
+                    return self.hot[key]
+                if key not in self.cold_sizes:
+                    raise KeyError(key)
+            self.rehydrate(key)
+
+    def __setitem__(self, key: Any, value: Any):
+        with self.lock:
+            self.hot[key] = value
+            self.last_used[key] = time.monotonic()
+            was_cold = self.cold_sizes.pop(key, None) is not None
+        if was_cold:
+            self._drop_blob(key)
+
+    def __delitem__(self, key: Any):
+        with self.lock:
+            if key in self.hot:
+                del self.hot[key]
+                del self.last_used[key]
+                return
+            if self.cold_sizes.pop(key, None) is None:
+                raise KeyError(key)
+        self._drop_blob(key)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.hot or key in self.cold_sizes
+
+    def __iter__(self) -> Iterator[Any]:
+        with self.lock:
+            return iter(list(self.hot) + list(self.cold_sizes))
+
+    def __len__(self) -> int:
+        return len(self.hot) + len(self.cold_sizes)
+
+    def evict_idle(self, max_idle: float, limit: Optional[int] = None) -> int:
+        """Evict entries unused for max_idle seconds (at most limit of them); returns how many"""
+        with self.evicting:
+            cutoff = time.monotonic() - max_idle
+            idle = [(key, used) for key, used in list(self.last_used.items()) if used <= cutoff][:limit]
+            evicted = 0
+            for key, used in idle:
+                value = self.hot.get(key)
+                # Compress and write outside the lock: a hot key's blob is only ever written
+                # here, and any use meanwhile shows up in last_used
+                blob = zlib.compress(json.dumps(value).encode(), self.level)
+                self.cold[key] = blob
+                with self.lock:
+                    if self.last_used.get(key) == used:
+                        self.cold_sizes[key] = len(blob)
+                        del self.hot[key]
+                        del self.last_used[key]
+                        evicted += 1
+                        continue
+                # Used (or removed) while being written: the blob is stale
+                self._drop_blob(key)
+            return evicted
+
+    def usage(self) -> Dict[Any, Tuple[int, int]]:
+        """Approximate (hot bytes, cold bytes) per key"""
+        with self.lock:
+            hot = list(self.hot.items())
+            sizes = {key: (0, size) for key, size in self.cold_sizes.items()}
+        sizes.update((key, (deep_size(value), 0)) for key, value in hot)
+        return sizes
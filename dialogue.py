@@ -0,0 +1,143 @@
+"""
+Autonomous character-to-character dialogue (staged debates between personas).
+
+Turns are pipelined: as soon as one speaker's streamed reply is final, the next
+speaker's request starts, overlapping with posting the previous turn to Discord.
+That next turn is speculative. If a user interjects while it is generating, it is
+discarded and regenerated so the speaker sees the interjection.
+
+Given a LoadShedder, every turn goes through the same overload policy as regular
+replies: it counts towards queue depth and may be degraded or rejected (Overloaded).
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Executor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class Dialogue:
+    """A multi-turn conversation between characters on a topic, with one shared transcript"""
+
+    def __init__(self, client, speakers: List[Tuple[str, Dict[str, Any]]], topic: str, turns: int, executor: Optional[Executor] = None,
+                 load_shedder=None):
+        self.client = client
+        self.load_shedder = load_shedder
+        self.executor = executor  # threads the turns stream on (the loop's default executor if None)
+        self.speakers = speakers  # [(character_id, character), ...] in speaking order
+        self.topic = topic
+        self.turns = turns
+        self.transcript: List[Dict[str, str]] = []  # [{"speaker", "name", "content"}, ...]
+        self.stopped = False
+        self._current_stop: Optional[threading.Event] = None
+
+    def interject(self, name: str, content: str):
+        """Add a user's message to the shared transcript; the next speaker will respond to it"""
+        self.transcript.append({"speaker": None, "name": name, "content": content})
+        # A speculative turn generated without this message is now stale
+        if self._current_stop:
+            self._current_stop.set()
+
+    def stop(self):
+        """Stop after aborting the turn currently being generated"""
+        self.stopped = True
+        if self._current_stop:
+            self._current_stop.set()
+
+    def view_for(self, char_id: str, character: Dict[str, Any]) -> List[Dict[str, str]]:
+        """The transcript as seen by one speaker: own turns as assistant, everyone else as user"""
+        others = ", ".join(c["name"] for other_id, c in self.speakers if other_id != char_id)
+        system_prompt = (
+            f"{character['system_prompt']}\n\n"
+            f"You are {character['name']}, taking part in a staged dialogue with {others}. "
+            f"Reply in character with a single turn, addressing what was just said."
+        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"The topic is: {self.topic}"}
+        ]
+        for entry in self.transcript:
+            if entry["speaker"] == char_id:
+                message = {"role": "assistant", "content": entry["content"]}
+            else:
+                message = {"role": "user", "content": f"{entry['name']}: {entry['content']}"}
+            # Merge consecutive same-role messages (some providers require alternation)
+            if messages[-1]["role"] == message["role"]:
+                messages[-1] = {"role": message["role"], "content": messages[-1]["content"] + "\n\n" + message["content"]}
+            else:
+                messages.append(message)
+        return messages
+
+    def _generate(self, model: str, max_tokens: int, temperature: float, messages: List[Dict[str, str]], stop_event: threading.Event) -> Optional[str]:
+        """Stream one turn in a worker thread; returns None if aborted"""
+        parts = []
+        stream = self.client.stream_completion(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        try:
+            for delta in stream:
+                if stop_event.is_set():
+                    return None
+                parts.append(delta)
+        finally:
+            # Closing the stream aborts the upstream request
+            stream.close()
+        return None if stop_event.is_set() else "".join(parts)
+
+    async def _turn(self, character: Dict[str, Any], messages: List[Dict[str, str]], stop_event: threading.Event) -> Optional[str]:
+        """Generate one turn off the event loop, under the overload policy if there is one"""
+        loop = asyncio.get_running_loop()
+        if self.load_shedder is None:
+            return await loop.run_in_executor(self.executor, self._generate, character["model"], character["max_tokens"],
+                                              character["temperature"], messages, stop_event)
+        _, model, max_tokens = self.load_shedder.plan(character)
+        with self.load_shedder.track(model):
+            return await loop.run_in_executor(self.executor, self._generate, model, max_tokens,
+                                              character["temperature"], messages, stop_event)
+
+    def _start_turn(self, turn: int):
+        """Start generating a turn in the background, returning (task, stop event, transcript length)"""
+        char_id, character = self.speakers[turn % len(self.speakers)]
+        stop_event = threading.Event()
+        self._current_stop = stop_event
+        messages = self.view_for(char_id, character)
+        task = asyncio.ensure_future(self._turn(character, messages, stop_event))
+        return task, stop_event, len(self.transcript)
+
+    async def run(self, post: Callable[[str, Dict[str, Any], str], Awaitable[None]]):
+        """Run all turns, calling post(character_id, character, text) for each finished turn"""
+        if not self.speakers or self.turns < 1:
+            return
+        pending = self._start_turn(0)
+        turn = 0
+        try:
+            while turn < self.turns and not self.stopped:
+                task, stop_event, seen = pending
+                text = await task
+                if self.stopped:
+                    break
+                if text is None or len(self.transcript) != seen:
+                    # Interjected while speculating: regenerate this turn with the new transcript
+                    stop_event.set()
+                    pending = self._start_turn(turn)
+                    continue
+                char_id, character = self.speakers[turn % len(self.speakers)]
+                self.transcript.append({"speaker": char_id, "name": character["name"], "content": text})
+                turn += 1
+                # Start the next speaker now, overlapping generation with posting this turn
+                if turn < self.turns:
+                    pending = self._start_turn(turn)
+                await post(char_id, character, text)
+        finally:
+            # A speculative turn left behind by stop() or a failed post() must not keep streaming
+            task, stop_event, _ = pending
+            stop_event.set()
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._current_stop = None
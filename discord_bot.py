@@ -1,27 +1,119 @@
-import discord
-from discord.ext import commands
+from import_timing import import_timer, IMPORT_TIMES, STARTED_AT
 import os
-from dotenv import load_dotenv
+import time
 import asyncio
 import json
+import atexit
+import threading
+import signal
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+with import_timer("dotenv"):
+    from dotenv import load_dotenv
 
 # Load environment variables FIRST - specify the path explicitly
 load_dotenv(dotenv_path='.env')
 
-# Import AI client AFTER loading environment variables
-from ai_client import ai_client
+# Fail fast on a missing token, before paying for the heavy imports below
+if __name__ == '__main__' and not os.getenv("DISCORD_BOT_TOKEN"):
+    print("Error: DISCORD_BOT_TOKEN not found in environment variables")
+    exit(1)
+
+with import_timer("discord"):
+    import discord
+    from discord.ext import commands
+
+# Import AI client AFTER loading environment variables (provider SDKs load lazily)
+with import_timer("ai_client"):
+    from ai_client import ai_client, CompletionCancelled
+    from dialogue import Dialogue
+    from overload import LoadShedder, Overloaded, LEVEL_NAMES, validate_overload
+    from reply_budget import ReplyBudget
+    from structured_logging import setup_logging, get_logger, log_context
+
+# Logs go through a queue to a writer thread, never blocking the event loop
+setup_logging()
+log = get_logger("discord_bot")
+
+def parse_shard_ids(value):
+    """Parse a shard list like "0,1,4-7" into a list of shard IDs"""
+    shard_ids = []
+    for part in value.split(','):
+        part = part.strip()
+        if '-' in part:
+            start, end = part.split('-', 1)
+            shard_ids.extend(range(int(start), int(end) + 1))
+        elif part:
+            shard_ids.append(int(part))
+    return shard_ids
+
+# Slash-command mode: commands arrive as interactions, so the bot needs neither the
+# privileged message content intent nor any message events
+SLASH_COMMANDS = os.getenv("SLASH_COMMANDS") == "1"
 
 # Configure Discord bot
 intents = discord.Intents.default()
-intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Typing events are never used; skip them
+intents.typing = False
+if SLASH_COMMANDS:
+    intents.messages = False
+else:
+    intents.message_content = True
+
+# Sharding: SHARD_COUNT is the total across all processes, SHARD_IDS the ones this
+# process runs (see launch_shards.py). AUTO_SHARD=1 lets Discord pick the count.
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+SHARD_IDS = os.getenv("SHARD_IDS")
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        command_prefix='!',
+        intents=intents,
+        shard_count=int(SHARD_COUNT),
+        shard_ids=parse_shard_ids(SHARD_IDS) if SHARD_IDS else None
+    )
+elif os.getenv("AUTO_SHARD") == "1":
+    bot = commands.AutoShardedBot(command_prefix='!', intents=intents)
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents)
+
+# Optional SQLite database shared by all shard processes (in-memory dicts otherwise)
+BOT_STATE_DB = os.getenv("BOT_STATE_DB")
+state_store = None
+if BOT_STATE_DB:
+    from state_store import SQLiteStore
+    state_store = SQLiteStore(BOT_STATE_DB)
+    # Commit writes still queued when the process exits
+    atexit.register(state_store.close)
+
+# Histories and last replies of channels idle for CONVERSATION_IDLE_SECONDS (0 disables) are
+# compressed into cold storage, in memory or under COLD_STORE_DIR, and restored on next use
+CONVERSATION_IDLE_SECONDS = float(os.getenv("CONVERSATION_IDLE_SECONDS", "1800"))
+COLD_STORE_DIR = os.getenv("COLD_STORE_DIR")
+
+def channel_state_table(name):
+    """Per-channel state: shared SQLite table, evictable TieredDict or plain dict"""
+    if state_store:
+        return state_store.table(name)
+    if CONVERSATION_IDLE_SECONDS > 0:
+        from cold_store import TieredDict
+        return TieredDict(os.path.join(COLD_STORE_DIR, name) if COLD_STORE_DIR else None)
+    return {}
 
 # Store conversation history per channel
-conversations = {}
+conversations = channel_state_table("conversations")
 
 # Get AI channel name from environment
 AI_CHANNEL_NAME = os.getenv("AI_CHANNEL_NAME", "ai-chat")
 
+# Channels the bot chats in without a command: any channel named AI_CHANNEL_NAME plus
+# the IDs in AI_CHANNEL_IDS. Kept as a set of IDs, updated on channel events, so
+# on_message costs one set lookup instead of a name comparison.
+AI_CHANNEL_IDS = {int(part) for part in os.getenv("AI_CHANNEL_IDS", "").split(',') if part.strip()}
+ai_channel_ids = set(AI_CHANNEL_IDS)
+
 # File to store system prompts and characters
 PROMPTS_FILE = "system_prompts.json"
 CHARACTERS_FILE = "characters.json"
@@ -45,7 +137,7 @@ def load_system_prompts():
             with open(PROMPTS_FILE, 'r') as f:
                 return json.load(f)
     except Exception as e:
-        print(f"Error loading system prompts: {e}")
+        log.error("prompts_load_failed", error=str(e))
     return {}
 
 def save_system_prompts(prompts_data):
@@ -54,7 +146,13 @@ def save_system_prompts(prompts_data):
         with open(PROMPTS_FILE, 'w') as f:
             json.dump(prompts_data, f, indent=2)
     except Exception as e:
-        print(f"Error saving system prompts: {e}")
+        log.error("prompts_save_failed", error=str(e))
+
+def save_prompt(channel_id, prompt):
+    """Remember a channel's system prompt (BOT_STATE_DB persists it by itself)"""
+    saved_prompts[str(channel_id)] = prompt
+    if not state_store:
+        save_system_prompts(saved_prompts)
 
 # Default characters with different parameters
 DEFAULT_CHARACTERS = {
@@ -108,52 +206,775 @@ DEFAULT_CHARACTERS = {
     }
 }
 
+# Required fields (and their types) for every character definition
+CHARACTER_FIELDS = {
+    "name": str,
+    "description": str,
+    "system_prompt": str,
+    "temperature": (int, float),
+    "max_tokens": int,
+    "model": str
+}
+
+# Warm up provider clients and connections when the bot connects (set to 0 to disable)
+WARMUP_ON_READY = os.getenv("WARMUP_ON_READY", "1") == "1"
+
+# How often to poll the characters file for changes, in seconds (0 disables hot reload)
+CHARACTERS_RELOAD_INTERVAL = float(os.getenv("CHARACTERS_RELOAD_INTERVAL", "2"))
+
+def validate_characters(loaded):
+    """Validate character definitions, raising ValueError on the first problem found"""
+    if not isinstance(loaded, dict):
+        raise ValueError("Characters file must contain a JSON object")
+    for char_id, char_data in loaded.items():
+        if not isinstance(char_data, dict):
+            raise ValueError(f"Character '{char_id}' must be a JSON object")
+        for field, expected_type in CHARACTER_FIELDS.items():
+            if not isinstance(char_data.get(field), expected_type):
+                raise ValueError(f"Character '{char_id}' has a missing or invalid '{field}'")
+        if char_data["model"] not in ai_client.model_mappings:
+            raise ValueError(f"Character '{char_id}' uses unsupported model '{char_data['model']}'")
+        if "overload" in char_data:
+            try:
+                validate_overload(char_data["overload"])
+            except ValueError as e:
+                raise ValueError(f"Character '{char_id}' has an invalid 'overload': {e}") from None
+
+def check_character_models(snapshot):
+    """Log characters whose model the catalog knows to be unavailable or misconfigured"""
+    for char_id, char_data in snapshot.items():
+        for problem in ai_client.catalog.problems(char_data["model"], char_data.get("max_tokens")):
+            log.warning("character_model_problem", character=char_id, problem=problem)
+
+def characters_file_signature():
+    """Cheap change detector for the characters file: (mtime, inode, size), or None if missing"""
+    try:
+        stat = os.stat(CHARACTERS_FILE)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+def read_characters_snapshot():
+    """Read and validate the characters file, returning (signature, characters)"""
+    # Take the signature first so a write racing with the read is picked up on the next poll
+    signature = characters_file_signature()
+    with open(CHARACTERS_FILE, 'r') as f:
+        loaded = json.load(f)
+    validate_characters(loaded)
+    snapshot = DEFAULT_CHARACTERS.copy()
+    snapshot.update(loaded)
+    return signature, snapshot
+
 def load_characters():
     """Load characters from file"""
     try:
         if os.path.exists(CHARACTERS_FILE):
             with open(CHARACTERS_FILE, 'r') as f:
                 loaded = json.load(f)
-                # Merge with defaults, allowing loaded characters to override
-                characters = DEFAULT_CHARACTERS.copy()
-                characters.update(loaded)
-                return characters
+            if not isinstance(loaded, dict):
+                raise ValueError("Characters file must contain a JSON object")
+            # Merge with defaults, allowing loaded characters to override
+            characters = DEFAULT_CHARACTERS.copy()
+            for char_id, char_data in loaded.items():
+                try:
+                    validate_characters({char_id: char_data})
+                except ValueError as e:
+                    # Skip just this character; the rest of the file still loads
+                    log.error("character_invalid", character=char_id, error=str(e))
+                    continue
+                characters[char_id] = char_data
+            check_character_models(characters)
+            return characters
     except Exception as e:
-        print(f"Error loading characters: {e}")
+        log.error("characters_load_failed", error=str(e))
     return DEFAULT_CHARACTERS.copy()
 
 def save_characters(characters_data):
     """Save characters to file"""
+    global characters_signature
     try:
         with open(CHARACTERS_FILE, 'w') as f:
             json.dump(characters_data, f, indent=2)
+        # Our own write is already in memory, so don't let the watcher reload it
+        characters_signature = characters_file_signature()
+        characters_changed()
     except Exception as e:
-        print(f"Error saving characters: {e}")
+        log.error("characters_save_failed", error=str(e))
 
-# Load saved system prompts and characters
-saved_prompts = load_system_prompts()
+# Load saved system prompts and characters. With a shared BOT_STATE_DB prompts live there,
+# so shard processes don't overwrite each other's prompts file.
+if state_store:
+    saved_prompts = state_store.table("system_prompts")
+    if not saved_prompts:
+        # First start on a shared store: carry over prompts saved by a single process
+        saved_prompts.update(load_system_prompts())
+else:
+    saved_prompts = load_system_prompts()
 characters = load_characters()
 
+# Characters are swapped in as whole snapshots: handlers hold a reference to the
+# character dict they started with, so in-flight requests finish on the old version
+characters_version = 1
+characters_signature = characters_file_signature()
+characters_watcher = None
+
+def characters_changed():
+    """Bump the characters version after an in-place edit (invalidates cached embeds)"""
+    global characters_version
+    characters_version += 1
+
+warmup_task = None
+catalog_task = None
+eviction_task = None
+commands_synced = False
+
+async def watch_characters_file():
+    """Poll the characters file and atomically swap in new validated snapshots"""
+    global characters, characters_version, characters_signature
+    while not bot.is_closed():
+        await asyncio.sleep(CHARACTERS_RELOAD_INTERVAL)
+        signature = characters_file_signature()
+        if signature is None or signature == characters_signature:
+            continue
+        try:
+            # Parse and validate off the event loop
+            signature, snapshot = await asyncio.to_thread(read_characters_snapshot)
+        except Exception as e:
+            # Keep serving the current snapshot until the file changes again
+            characters_signature = signature
+            log.error("characters_reload_failed", version=characters_version, error=str(e))
+            continue
+        characters = snapshot
+        characters_signature = signature
+        characters_version += 1
+        log.info("characters_reloaded", file=CHARACTERS_FILE, version=characters_version, characters=len(characters))
+        check_character_models(characters)
+
 # Track active character per channel
-active_characters = {}  # channel_id -> character_name
+active_characters = state_store.table("active_characters") if state_store else {}  # channel_id -> character_name
 
 # Track last bot responses per channel for follow-up
-last_bot_responses = {}  # channel_id -> last_assistant_message
+last_bot_responses = channel_state_table("last_bot_responses")  # channel_id -> last_assistant_message
+
+# Characters answering together per channel (ensemble mode)
+ensembles = state_store.table("ensembles") if state_store else {}  # channel_id -> [character_name, ...]
+
+# Most characters that can sit on one ensemble panel
+MAX_ENSEMBLE_SIZE = 6
+
+# Seconds an ensemble waits for replies before posting what it has
+ENSEMBLE_DEADLINE = float(os.getenv("ENSEMBLE_DEADLINE", "60"))
+
+# Debounce window for rapid-fire messages in the AI channel (0 disables). Scope "user"
+# merges each user's messages separately, "all" merges everyone's. While a reply is
+# generating, "absorb" queues new input for the next turn and "restart" cancels the
+# reply and regenerates it with the new input included.
+AGGREGATION_DEFAULTS = {
+    "window": float(os.getenv("AGGREGATION_WINDOW", "0")),
+    "scope": os.getenv("AGGREGATION_SCOPE", "user"),
+    "busy": os.getenv("AGGREGATION_BUSY", "absorb")
+}
+
+# Per-channel overrides of AGGREGATION_DEFAULTS, set with !window
+aggregation = state_store.table("aggregation") if state_store else {}  # channel_id -> settings
+
+# Messages waiting for their window to close, and turns currently being answered
+pending_turns = {}  # (channel_id, user_id or None) -> {"parts", "timer"}
+answering_turns = {}  # (channel_id, user_id or None) -> {"parts", "source_id", "done"}
+
+# In-flight generations: task -> (channel_id, source_message_id, cancel_event, user_message)
+generations = {}
+
+# Overload policy: degrades or rejects requests as queues and latency grow
+load_shedder = LoadShedder(ai_client)
+
+# Learned max_tokens per character and model (the configured value is the cap)
+reply_budget = ReplyBudget()
+
+# Opt-in traffic recording for offline replay (see traffic.py and replay_traffic.py)
+TRAFFIC_RECORD = os.getenv("TRAFFIC_RECORD")
+recorder = None
+if TRAFFIC_RECORD:
+    from traffic import TrafficRecorder
+    recorder = TrafficRecorder(TRAFFIC_RECORD, redact_content=os.getenv("TRAFFIC_REDACT") == "1")
+    ai_client.recorder = recorder
+    atexit.register(recorder.close)
+
+# What to do when a reply hits max_tokens: "off", "precompute" (generate the continuation in
+# the background so !continue_chat answers instantly) or "stitch" (append continuations
+# automatically, up to CONTINUATION_MAX_PARTS requests per reply)
+CONTINUATION_MODE = os.getenv("CONTINUATION_MODE", "off").lower()
+CONTINUATION_MAX_PARTS = int(os.getenv("CONTINUATION_MAX_PARTS", "3"))
+
+# Optional long-term memory (MEMORY_DIR enables it): every exchange is indexed per channel
+# and the most relevant older ones are added to the prompt
+MEMORY_DIR = os.getenv("MEMORY_DIR")
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "3"))
+MEMORY_MIN_SCORE = float(os.getenv("MEMORY_MIN_SCORE", "0.1"))
+MEMORY_SNIPPET_CHARS = 600
+long_term_memory = None
+if MEMORY_DIR:
+    with import_timer("memory"):
+        from memory import LongTermMemory
+    long_term_memory = LongTermMemory(MEMORY_DIR)
+
+# Long-term memory writes in flight (referenced so they aren't garbage-collected mid-write)
+memory_writes = set()
+
+# Background continuations of truncated replies, per channel
+continuations = {}  # channel_id -> {"task", "after"}
+
+# Running character-to-character dialogues per channel
+dialogues = {}  # channel_id -> Dialogue
+
+# Most turns a single !debate may run
+MAX_DIALOGUE_TURNS = 20
+
+# Provider calls block a thread for the whole generation. They get their own pool so a
+# saturated bot never starves the default executor that commands and housekeeping use.
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "32"))
+llm_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+async def run_llm(func, *args, **kwargs):
+    """asyncio.to_thread() on the provider pool (the log context carries over)"""
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(llm_executor, call)
+
+# Embeds of the info commands, rebuilt only when what they show changes
+embed_cache = {}  # name -> (key, embed)
+
+def cached_embed(name, key, build):
+    """The embed cached under name if it was built for key, else build() it and cache that"""
+    cached = embed_cache.get(name)
+    if cached is None or cached[0] != key:
+        cached = (key, build())
+        embed_cache[name] = cached
+    return cached[1]
+
+def prerender_embeds():
+    """Build the static info embeds up front so the first !guide is as fast as the rest"""
+    cached_embed("presets", None, presets_embed)
+    for section in GUIDE_SECTIONS:
+        cached_embed(("guide", section), None, lambda: guide_embed(section))
+
+async def complete(char_id, character, messages, cancel_event=None):
+    """Get a chat completion with a character's model and parameters, without blocking the event loop.
+    
+    Under load the request may be degraded (fewer max_tokens, fallback model) or rejected
+    with Overloaded, per the character's overload policy. max_tokens is lowered to what the
+    character's replies on that model actually need once enough have been seen. Setting
+    cancel_event aborts the upstream stream.
+    """
+    level, model, cap = load_shedder.plan(character)
+    max_tokens = reply_budget.max_tokens(char_id, model, cap)
+    messages = fit_to_context(messages, model, max_tokens)
+    start = time.perf_counter()
+    with load_shedder.track(model):
+        response = await run_llm(
+            ai_client.cancellable_completion,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=character["temperature"],
+            cancel_event=cancel_event or threading.Event()
+        )
+    reply_budget.observe(char_id, model, response, max_tokens, cap, character["max_tokens"])
+    log.info(
+        "completion",
+        model=model,
+        load_level=LEVEL_NAMES[level],
+        max_tokens=max_tokens,
+        max_tokens_cap=cap,
+        latency_ms=round((time.perf_counter() - start) * 1000),
+        tokens=response.tokens_used,
+        completion_tokens=response.completion_tokens,
+        finish_reason=response.finish_reason
+    )
+    return response
+
+def estimate_tokens(message):
+    """Rough token count (about 4 characters per token, plus per-message overhead)"""
+    return len(message["content"]) // 4 + 4
+
+def fit_to_context(messages, model, max_tokens):
+    """Drop the oldest turns (never the system prompt) until the prompt leaves room for the reply"""
+    context_length = ai_client.catalog.context_length(model)
+    if not context_length:
+        return messages
+    budget = context_length - max_tokens
+    total = sum(estimate_tokens(message) for message in messages)
+    start = 1
+    while total > budget and start < len(messages) - 1:
+        total -= estimate_tokens(messages[start])
+        start += 1
+    return messages if start == 1 else messages[:1] + messages[start:]
+
+async def generate(channel_id, source_id, char_id, character, messages, user_message=None):
+    """Run complete() as a cancellable task tracked by channel and source message.
+    
+    Raises CompletionCancelled if cancel_generations() aborts it. user_message is the
+    user turn already added to the channel's history for this generation, if any.
+    """
+    cancel_event = threading.Event()
+    # The task inherits this context, so its log records carry the request fields
+    with log_context(channel=channel_id, source=source_id, character=character["name"]):
+        task = asyncio.create_task(complete(char_id, character, messages, cancel_event))
+    generations[task] = (channel_id, source_id, cancel_event, user_message)
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if cancel_event.is_set():
+            raise CompletionCancelled(f"Generation for message {source_id} cancelled")
+        # Cancelled from outside (e.g. an ensemble deadline): still abort the upstream stream
+        cancel_event.set()
+        raise
+    finally:
+        generations.pop(task, None)
+
+def cancel_generations(channel_id, source_id=None):
+    """Abort in-flight generations in a channel (or for one source message) and discard their output"""
+    cancelled = 0
+    for task, (gen_channel_id, gen_source_id, cancel_event, user_message) in list(generations.items()):
+        if gen_channel_id != channel_id or (source_id is not None and gen_source_id != source_id):
+            continue
+        # The event stops the upstream stream in the worker thread; cancel() stops waiting for it
+        cancel_event.set()
+        task.cancel()
+        del generations[task]
+        cancelled += 1
+        
+        # Drop the unanswered user turn so it doesn't linger in the history
+        if user_message is not None and channel_id in conversations:
+            history = conversations[channel_id]
+            for i in range(len(history) - 1, 0, -1):
+                if history[i] == {"role": "user", "content": user_message}:
+                    conversations[channel_id] = history[:i] + history[i + 1:]
+                    break
+    return cancelled
+
+def active_character(channel_id):
+    """(character ID, character) answering in a channel, falling back to the default character"""
+    char_id = active_characters.get(channel_id, "default")
+    if char_id not in characters:
+        char_id = "default"
+    return char_id, characters[char_id]
+
+async def respond(channel, channel_id, user_message, source_id=None):
+    """Send a user turn to the channel's active character and post the reply.
+    
+    source_id is the Discord message that triggered it, so deleting or editing that
+    message can cancel the generation.
+    """
+    # A new turn makes any precomputed continuation stale
+    discard_continuation(channel_id)
+    await rehydrate(channel_id)
+    
+    # Initialize conversation for this channel if it doesn't exist
+    if channel_id not in conversations:
+        # Get active character for this channel
+        active_char = active_characters.get(channel_id, "default")
+        character = characters.get(active_char, characters["default"])
+        start_conversation(channel_id, character["system_prompt"])
+    
+    # Add user message to conversation
+    append_to_conversation(channel_id, "user", user_message)
+    
+    # Show typing indicator
+    async with channel.typing():
+        try:
+            # Get active character for this channel
+            char_id, character = active_character(channel_id)
+            
+            # Get response from AI with character parameters (off the event loop)
+            messages = await with_memories(channel_id, user_message)
+            response = await generate(channel_id, source_id, char_id, character, messages, user_message)
+            
+            # Extract the assistant's response
+            assistant_message = response.content
+            if CONTINUATION_MODE == "stitch" and response.truncated:
+                assistant_message, response = await stitch_continuations(channel_id, source_id, char_id, character, response, user_message)
+            
+            # Add assistant's response to conversation
+            append_to_conversation(channel_id, "assistant", assistant_message)
+            
+            # Store last bot response for follow-up command
+            last_bot_responses[channel_id] = assistant_message
+            log.debug("reply", channel=channel_id, chars=len(assistant_message))
+            
+            await send_long(channel, assistant_message)
+            remember_exchange(channel_id, user_message, assistant_message)
+            
+            if CONTINUATION_MODE == "precompute" and response.truncated:
+                precompute_continuation(channel_id, char_id, character, assistant_message)
+        
+        except CompletionCancelled:
+            # Superseded by an edit, delete, reset or character switch: discard silently
+            pass
+        except Overloaded as e:
+            # Fast "busy" reply instead of queueing behind a saturated provider
+            await channel.send(str(e))
+        except Exception as e:
+            await channel.send(f"Sorry, I encountered an error: {str(e)}")
+            log.error("reply_failed", channel=channel_id, error=str(e))
+
+async def with_memories(channel_id, query):
+    """The channel's history, with relevant older exchanges from long-term memory in the system prompt"""
+    history = conversations[channel_id]
+    if not long_term_memory:
+        return history
+    # Exchanges still in the short-term history (up to 20 messages) are not recalled again
+    snippets = await asyncio.to_thread(long_term_memory.recall, channel_id, query, MEMORY_TOP_K, 10, MEMORY_MIN_SCORE)
+    if not snippets:
+        return history
+    excerpts = "\n\n".join(snippet[:MEMORY_SNIPPET_CHARS] for snippet in snippets)
+    system_prompt = f"{history[0]['content']}\n\nRelevant excerpts from earlier in this conversation:\n\n{excerpts}"
+    return [{"role": "system", "content": system_prompt}] + history[1:]
+
+def remember_exchange(channel_id, user_message, assistant_message):
+    """Index an exchange in long-term memory, in the background"""
+    if long_term_memory:
+        task = asyncio.create_task(asyncio.to_thread(long_term_memory.add, channel_id, [f"User: {user_message}\nAssistant: {assistant_message}"]))
+        memory_writes.add(task)
+        task.add_done_callback(lambda t: memory_write_done(t, channel_id))
+
+def memory_write_done(task, channel_id):
+    memory_writes.discard(task)
+    if not task.cancelled() and task.exception():
+        log.error("memory_write_failed", channel=channel_id, error=str(task.exception()))
+
+def continuation_prompt(last_response):
+    """The user turn !continue_chat sends to continue the last reply"""
+    return f"Please continue or elaborate on your previous response. For context, your last response was: \"{last_response[:200]}{'...' if len(last_response) > 200 else ''}\""
+
+async def stitch_continuations(channel_id, source_id, char_id, character, response, user_message):
+    """Keep requesting continuations of a truncated reply, returning (full text, last response)"""
+    parts = [response.content]
+    while response.truncated and len(parts) < CONTINUATION_MAX_PARTS:
+        messages = conversations[channel_id] + [
+            {"role": "assistant", "content": "".join(parts)},
+            {"role": "user", "content": "Continue exactly where you left off, without repeating anything."}
+        ]
+        response = await generate(channel_id, source_id, char_id, character, messages, user_message)
+        parts.append(response.content)
+    return "".join(parts), response
+
+def precompute_continuation(channel_id, char_id, character, assistant_message):
+    """Start generating the !continue_chat answer for a truncated reply in the background"""
+    # Spare capacity only: under load the continuation may never be asked for
+    if load_shedder.level(character) > 0:
+        return
+    messages = conversations[channel_id] + [{"role": "user", "content": continuation_prompt(assistant_message)}]
+    task = asyncio.create_task(generate(channel_id, None, char_id, character, messages))
+    # Retrieve failures here so an unused continuation doesn't log "exception never retrieved"
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    continuations[channel_id] = {"task": task, "after": assistant_message}
+
+def discard_continuation(channel_id):
+    """Cancel a channel's precomputed continuation, if any"""
+    pending = continuations.pop(channel_id, None)
+    if pending:
+        pending["task"].cancel()
+
+async def send_long(destination, text):
+    """Send a message, splitting it if needed (Discord has 2000 char limit)"""
+    for i in range(0, len(text), 2000):
+        await destination.send(text[i:i+2000])
+
+def start_conversation(channel_id, system_prompt):
+    """Start a fresh conversation for a channel with the given system prompt"""
+    conversations[channel_id] = [
+        {"role": "system", "content": system_prompt}
+    ]
+
+def forget_ensemble_histories(channel_id):
+    """Drop the panel characters' histories in a channel (the next ensemble reply starts them fresh)"""
+    for char_id in ensembles.get(channel_id, []):
+        conversations.pop(f"{channel_id}/{char_id}", None)
+
+def append_to_conversation(channel_id, role, content):
+    """Append a message to a channel's history, keeping the system prompt and last 20 messages"""
+    history = conversations[channel_id]
+    history.append({"role": role, "content": content})
+    if len(history) > 21:  # 1 system + 20 messages
+        history = [history[0]] + history[-20:]
+    # Assign back so shared (SQLite-backed) state sees the change
+    conversations[channel_id] = history
+
+async def warm_up_providers():
+    """Construct clients, open connections and health-check every provider a character uses"""
+    used = {ai_client.model_mappings[c["model"]]["provider"] for c in characters.values() if c["model"] in ai_client.model_mappings}
+    providers = [p for p in ai_client.configured_providers() if p in used]
+    results = await run_llm(ai_client.warm_up, providers)
+    for provider, health in results.items():
+        log.info("warm_up", provider=provider, healthy=health["healthy"], error=health["error"], latency_ms=round(health["latency"] * 1000))
+
+async def refresh_model_catalog():
+    """Keep provider model lists fresh (disk-cached, so mostly a no-op after restarts)"""
+    while True:
+        providers = ai_client.configured_providers()
+        stale = ai_client.catalog.stale_providers(providers)
+        if stale:
+            errors = await run_llm(ai_client.catalog.refresh, stale)
+            for provider, error in errors.items():
+                log.warning("model_catalog_refresh_failed", provider=provider, error=error)
+            log.info("model_catalog_refreshed", providers=[p for p in stale if p not in errors])
+            check_character_models(characters)
+        await asyncio.sleep(min(ai_client.catalog.ttl, 3600))
+
+# Entries evicted per pass before yielding to the event loop
+EVICTION_BATCH = 200
+
+async def evict_idle_conversations():
+    """Periodically move idle channels' histories and last replies to cold storage"""
+    while True:
+        await asyncio.sleep(min(CONVERSATION_IDLE_SECONDS, 60))
+        evicted = 0
+        for table in (conversations, last_bot_responses):
+            while True:
+                # Compression and (with COLD_STORE_DIR) file writes stay off the event loop
+                count = await asyncio.to_thread(table.evict_idle, CONVERSATION_IDLE_SECONDS, EVICTION_BATCH)
+                evicted += count
+                if count < EVICTION_BATCH:
+                    break
+                await asyncio.sleep(0)
+        if evicted:
+            log.info("conversations_evicted", entries=evicted, hot=len(conversations.hot), cold=len(conversations.cold_sizes))
+
+async def rehydrate(*keys):
+    """Read evicted state back in a worker thread, so the reply path never waits on the disk"""
+    for table in (conversations, last_bot_responses):
+        if hasattr(table, "rehydrate"):
+            for key in keys:
+                if key in table.cold_sizes:
+                    await asyncio.to_thread(table.rehydrate, key)
+
+def state_usage():
+    """Approximate hot and cold bytes of conversation state, per channel ID"""
+    usage = {}
+    for table in (conversations, last_bot_responses):
+        for key, (hot, cold) in table.usage().items():
+            # Ensemble histories are keyed "channel/character"
+            channel_id = int(str(key).split('/')[0])
+            total_hot, total_cold = usage.get(channel_id, (0, 0))
+            usage[channel_id] = (total_hot + hot, total_cold + cold)
+    return usage
+
+def process_rss():
+    """Resident set size in bytes (Linux only, None elsewhere)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
 
 @bot.event
 async def on_ready():
-    print(f'{bot.user} has connected to Discord!')
-    print(f'Bot is in {len(bot.guilds)} servers')
-    print(f'AI channel configured: #{AI_CHANNEL_NAME}')
+    # Guild channels are cached by now; also catches changes missed while disconnected
+    refresh_ai_channels()
+    log.info(
+        "ready",
+        user=str(bot.user),
+        guilds=len(bot.guilds),
+        shards=(bot.shard_ids or list(range(bot.shard_count))) if bot.shard_count else None,
+        shard_count=bot.shard_count,
+        ai_channel=AI_CHANNEL_NAME,
+        ai_channels=len(ai_channel_ids),
+        slash_commands=SLASH_COMMANDS,
+        startup_ms=round((time.perf_counter() - STARTED_AT) * 1000),
+        import_ms={label: round(seconds * 1000, 1) for label, seconds in IMPORT_TIMES.items()}
+    )
+    
+    # on_ready fires again after reconnects, so only start the watcher once
+    global characters_watcher, warmup_task, catalog_task, eviction_task, commands_synced
+    if CHARACTERS_RELOAD_INTERVAL > 0 and (characters_watcher is None or characters_watcher.done()):
+        characters_watcher = asyncio.create_task(watch_characters_file())
+    
+    # Warm up in the background so the first reply is as fast as the hundredth
+    if WARMUP_ON_READY and warmup_task is None:
+        warmup_task = asyncio.create_task(warm_up_providers())
+    
+    if catalog_task is None:
+        catalog_task = asyncio.create_task(refresh_model_catalog())
+        prerender_embeds()
+    
+    if hasattr(conversations, "evict_idle") and eviction_task is None:
+        eviction_task = asyncio.create_task(evict_idle_conversations())
+    
+    # Register slash commands with Discord once, from the process running shard 0
+    if SLASH_COMMANDS and not commands_synced and (not bot.shard_ids or 0 in bot.shard_ids):
+        commands_synced = True
+        synced = await bot.tree.sync()
+        log.info("slash_commands_synced", commands=[command.name for command in synced])
+
+async def ensemble_reply(channel, channel_id, user_message, source_id=None):
+    """Fan one message out to the channel's ensemble concurrently, posting replies as they arrive"""
+    members = [char_id for char_id in ensembles[channel_id] if char_id in characters]
+    await rehydrate(channel_id, *(f"{channel_id}/{char_id}" for char_id in members))
+    
+    async def ask(char_id):
+        # Each panel character keeps its own history (and model) within the channel
+        character = characters[char_id]
+        key = f"{channel_id}/{char_id}"
+        if key not in conversations:
+            start_conversation(key, character["system_prompt"])
+        messages = conversations[key] + [{"role": "user", "content": user_message}]
+        response = await generate(channel_id, source_id, char_id, character, messages)
+        # Only record the exchange once it completed, so timeouts leave no dangling turn
+        append_to_conversation(key, "user", user_message)
+        append_to_conversation(key, "assistant", response.content)
+        return response.content
+    
+    tasks = {asyncio.create_task(ask(char_id)): char_id for char_id in members}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ENSEMBLE_DEADLINE
+    pending = set(tasks)
+    
+    # Panel latency is the slowest single reply (capped by the deadline), not the sum
+    async with channel.typing():
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0, deadline - loop.time()), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                name = characters.get(tasks[task], {}).get("name", tasks[task])
+                try:
+                    assistant_message = task.result()
+                except CompletionCancelled:
+                    continue
+                except Overloaded as e:
+                    await channel.send(f"**{name}:** {str(e)}")
+                    continue
+                except Exception as e:
+                    await channel.send(f"Sorry, **{name}** encountered an error: {str(e)}")
+                    log.error("reply_failed", channel=channel_id, character=tasks[task], error=str(e))
+                    continue
+                last_bot_responses[channel_id] = assistant_message
+                await send_long(channel, f"**{name}:** {assistant_message}")
+    
+    if pending:
+        for task in pending:
+            task.cancel()
+        missing = ", ".join(characters.get(tasks[task], {}).get("name", tasks[task]) for task in pending)
+        await channel.send(f"⏱️ No reply within {ENSEMBLE_DEADLINE:g}s from: {missing}")
+
+async def reply_to_turn(channel, channel_id, user_message, source_id):
+    """Answer a user turn with the channel's ensemble or active character"""
+    # Ensemble mode: every panel character answers
+    if channel_id in ensembles:
+        await ensemble_reply(channel, channel_id, user_message, source_id)
+    else:
+        await respond(channel, channel_id, user_message, source_id)
+
+def aggregation_settings(channel_id):
+    """A channel's aggregation window settings, falling back to the environment defaults"""
+    return {**AGGREGATION_DEFAULTS, **aggregation.get(channel_id, {})}
+
+def aggregate_message(message, user_message):
+    """Buffer a message and (re)start the channel's debounce timer"""
+    channel_id = message.channel.id
+    settings = aggregation_settings(channel_id)
+    key = (channel_id, message.author.id if settings["scope"] == "user" else None)
+    turn = pending_turns.setdefault(key, {"parts": [], "timer": None})
+    
+    # "restart": new input supersedes a reply still being generated for the previous turn
+    active = answering_turns.get(key)
+    if active and settings["busy"] == "restart" and cancel_generations(channel_id, active["source_id"]):
+        turn["parts"] = active["parts"] + turn["parts"]
+        del answering_turns[key]
+        active["done"].set()
+    
+    turn["parts"].append((message.author.display_name, user_message, message.id))
+    if turn["timer"]:
+        turn["timer"].cancel()
+    turn["timer"] = asyncio.create_task(flush_turn(message.channel, key, settings["window"]))
+
+async def flush_turn(channel, key, window):
+    """After the window passes quietly, send the buffered messages as a single user turn"""
+    await asyncio.sleep(window)
+    
+    # "absorb": wait for the reply in progress; messages arriving meanwhile join this turn
+    while key in answering_turns:
+        await answering_turns[key]["done"].wait()
+    
+    turn = pending_turns.pop(key, None)
+    if not turn or not turn["parts"]:
+        return
+    await answer_turn(channel, key, turn["parts"])
+
+async def answer_turn(channel, key, parts):
+    """Answer buffered (author, text, message_id) parts as one user turn"""
+    channel_id = key[0]
+    authors = {author for author, _, _ in parts}
+    if len(authors) > 1:
+        user_message = "\n".join(f"{author}: {text}" for author, text, _ in parts)
+    else:
+        user_message = "\n".join(text for _, text, _ in parts)
+    
+    # The last message is the source, so editing or deleting it cancels the reply
+    source_id = parts[-1][2]
+    active = {"parts": parts, "source_id": source_id, "done": asyncio.Event()}
+    answering_turns[key] = active
+    try:
+        await reply_to_turn(channel, channel_id, user_message, source_id)
+    finally:
+        # An edit or "restart" may have replaced this turn with a new one under the same key
+        if answering_turns.get(key) is active:
+            del answering_turns[key]
+        active["done"].set()
+
+def replace_part(parts, message_id, text):
+    """Turn parts with one message's text replaced (or dropped, if text is None)"""
+    return [(author, text if mid == message_id else part, mid) for author, part, mid in parts
+            if mid != message_id or text is not None]
+
+def refresh_ai_channel(channel):
+    """Add or drop one channel in the enabled set after it was created or renamed"""
+    if channel.id in AI_CHANNEL_IDS or getattr(channel, "name", None) == AI_CHANNEL_NAME:
+        ai_channel_ids.add(channel.id)
+    else:
+        ai_channel_ids.discard(channel.id)
+
+def refresh_ai_channels():
+    """Rebuild the enabled channel set from every guild's text channels"""
+    ai_channel_ids.clear()
+    ai_channel_ids.update(AI_CHANNEL_IDS)
+    for guild in bot.guilds:
+        for channel in guild.text_channels:
+            refresh_ai_channel(channel)
+
+@bot.event
+async def on_guild_channel_create(channel):
+    refresh_ai_channel(channel)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    refresh_ai_channel(after)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    ai_channel_ids.discard(channel.id)
+
+@bot.event
+async def on_guild_join(guild):
+    for channel in guild.text_channels:
+        refresh_ai_channel(channel)
+
+@bot.event
+async def on_guild_remove(guild):
+    for channel in guild.text_channels:
+        ai_channel_ids.discard(channel.id)
 
 @bot.event
 async def on_message(message):
-    # Don't respond to own messages
-    if message.author == bot.user:
+    # Don't respond to own messages, or take new work while shutting down
+    if message.author == bot.user or shutting_down:
         return
     
+    if recorder:
+        recorder.message(message, ai_channel=message.channel.id in ai_channel_ids)
+    
     # Check if message is in the AI channel
-    if message.channel.name == AI_CHANNEL_NAME:
+    if message.channel.id in ai_channel_ids:
         # Don't process if it's a command (starts with !)
         if message.content.startswith('!'):
             await bot.process_commands(message)
@@ -166,116 +987,100 @@ async def on_message(message):
         if not user_message:
             return
         
-        # Initialize conversation for this channel if it doesn't exist
-        if channel_id not in conversations:
-            # Get active character for this channel
-            active_char = active_characters.get(channel_id, "default")
-            character = characters.get(active_char, characters["default"])
-            conversations[channel_id] = [
-                {"role": "system", "content": character["system_prompt"]}
-            ]
+        # A running dialogue takes the message as an interjection
+        if channel_id in dialogues:
+            dialogues[channel_id].interject(message.author.display_name, user_message)
+            return
         
-        # Add user message to conversation
-        conversations[channel_id].append({"role": "user", "content": user_message})
+        # Merge rapid-fire messages into one turn when an aggregation window is set
+        if aggregation_settings(channel_id)["window"] > 0:
+            aggregate_message(message, user_message)
+            return
         
-        # Show typing indicator
-        async with message.channel.typing():
-            try:
-                # Get active character for this channel
-                active_char = active_characters.get(channel_id, "default")
-                character = characters.get(active_char, characters["default"])
-                
-                # Get response from AI with character parameters
-                response = ai_client.chat_completion(
-                    model=character["model"],
-                    messages=conversations[channel_id],
-                    max_tokens=character["max_tokens"],
-                    temperature=character["temperature"]
-                )
-                
-                # Extract the assistant's response
-                assistant_message = response.content
-                
-                # Add assistant's response to conversation
-                conversations[channel_id].append({"role": "assistant", "content": assistant_message})
-                
-                # Store last bot response for follow-up command
-                last_bot_responses[channel_id] = assistant_message
-                print(f"DEBUG: Stored response for channel {channel_id}: {assistant_message[:50]}...")
-                
-                # Keep conversation history manageable (last 20 messages)
-                if len(conversations[channel_id]) > 21:  # 1 system + 20 messages
-                    conversations[channel_id] = [conversations[channel_id][0]] + conversations[channel_id][-20:]
-                
-                # Split long messages if needed (Discord has 2000 char limit)
-                if len(assistant_message) > 2000:
-                    for i in range(0, len(assistant_message), 2000):
-                        await message.channel.send(assistant_message[i:i+2000])
-                else:
-                    await message.channel.send(assistant_message)
-                    
-            except Exception as e:
-                await message.channel.send(f"Sorry, I encountered an error: {str(e)}")
-                print(f"Error: {e}")
-    else:
-        # Process commands for other channels
+        await reply_to_turn(message.channel, channel_id, user_message, message.id)
+    elif message.content.startswith('!'):
+        # Process commands for other channels (without parsing every other message)
         await bot.process_commands(message)
 
+@bot.event
+async def on_message_delete(message):
+    """Abort any reply still being generated for a deleted message"""
+    if recorder:
+        recorder.delete(message)
+    cancel_generations(message.channel.id, message.id)
+
+@bot.event
+async def on_message_edit(before, after):
+    """Abort a reply to the old text of an edited message and answer the new text instead"""
+    if before.content == after.content:
+        return
+    if recorder:
+        recorder.edit(after)
+    channel_id = after.channel.id
+    user_message = after.content.strip()
+    if not user_message or user_message.startswith('!') or channel_id not in ai_channel_ids:
+        user_message = None
+    
+    # Still inside its aggregation window: the turn goes out with the new text
+    for key, turn in pending_turns.items():
+        if key[0] == channel_id:
+            turn["parts"] = replace_part(turn["parts"], after.id, user_message)
+    
+    # Part of an aggregated turn being answered: answer all of its parts again
+    for key, active in list(answering_turns.items()):
+        if key[0] == channel_id and any(mid == after.id for _, _, mid in active["parts"]):
+            if cancel_generations(channel_id, active["source_id"]):
+                parts = replace_part(active["parts"], after.id, user_message)
+                if parts:
+                    await answer_turn(after.channel, key, parts)
+            return
+    
+    if cancel_generations(channel_id, after.id) and user_message:
+        await reply_to_turn(after.channel, channel_id, user_message, after.id)
+
 @bot.command(name='chat')
 async def chat(ctx, *, message):
     """Chat with the AI bot"""
     channel_id = ctx.channel.id
     
-    # Initialize conversation for this channel if it doesn't exist
-    if channel_id not in conversations:
-        # Get active character for this channel
-        active_char = active_characters.get(channel_id, "default")
-        character = characters.get(active_char, characters["default"])
-        conversations[channel_id] = [
-            {"role": "system", "content": character["system_prompt"]}
-        ]
+    # Ensemble mode: every panel character answers
+    if channel_id in ensembles:
+        await ensemble_reply(ctx.channel, channel_id, message, ctx.message.id)
+        return
     
-    # Add user message to conversation
-    conversations[channel_id].append({"role": "user", "content": message})
+    await respond(ctx.channel, channel_id, message, ctx.message.id)
+
+@bot.command(name='window')
+async def set_window(ctx, seconds: float = None, scope=None, busy=None):
+    """Merge rapid-fire messages into one turn. Format: !window <seconds> [user|all] [absorb|restart]"""
+    channel_id = ctx.channel.id
     
-    # Show typing indicator
-    async with ctx.typing():
-        try:
-            # Get active character for this channel
-            active_char = active_characters.get(channel_id, "default")
-            character = characters.get(active_char, characters["default"])
-            
-            # Get response from AI with character parameters
-            response = ai_client.chat_completion(
-                model=character["model"],
-                messages=conversations[channel_id],
-                max_tokens=character["max_tokens"],
-                temperature=character["temperature"]
-            )
-            
-            # Extract the assistant's response
-            assistant_message = response.content
-            
-            # Add assistant's response to conversation
-            conversations[channel_id].append({"role": "assistant", "content": assistant_message})
-            
-            # Store last bot response for follow-up command
-            last_bot_responses[channel_id] = assistant_message
-            
-            # Keep conversation history manageable (last 20 messages)
-            if len(conversations[channel_id]) > 21:  # 1 system + 20 messages
-                conversations[channel_id] = [conversations[channel_id][0]] + conversations[channel_id][-20:]
-            
-            # Split long messages if needed (Discord has 2000 char limit)
-            if len(assistant_message) > 2000:
-                for i in range(0, len(assistant_message), 2000):
-                    await ctx.send(assistant_message[i:i+2000])
-            else:
-                await ctx.send(assistant_message)
-                
-        except Exception as e:
-            await ctx.send(f"Sorry, I encountered an error: {str(e)}")
-            print(f"Error: {e}")
+    if seconds is None:
+        settings = aggregation_settings(channel_id)
+        if settings["window"] > 0:
+            await ctx.send(f"Aggregation window: **{settings['window']:g}s**, merging {'each user' if settings['scope'] == 'user' else 'all users'}, **{settings['busy']}** while replying.")
+        else:
+            await ctx.send("Aggregation is off. Use `!window <seconds> [user|all] [absorb|restart]` to turn it on.")
+        return
+    
+    if not (0 <= seconds <= 30):
+        await ctx.send("Window must be between 0 and 30 seconds.")
+        return
+    if scope not in (None, "user", "all"):
+        await ctx.send("Scope must be `user` or `all`.")
+        return
+    if busy not in (None, "absorb", "restart"):
+        await ctx.send("Busy mode must be `absorb` or `restart`.")
+        return
+    
+    settings = aggregation_settings(channel_id)
+    settings.update({"window": seconds, "scope": scope or settings["scope"], "busy": busy or settings["busy"]})
+    aggregation[channel_id] = settings
+    
+    if seconds > 0:
+        await ctx.send(f"Messages sent within **{seconds:g}s** of each other now become one turn ({'per user' if settings['scope'] == 'user' else 'all users'}, {settings['busy']} while replying).")
+    else:
+        await ctx.send("Aggregation turned off. Every message gets its own reply.")
 
 @bot.command(name='reset')
 async def reset_conversation(ctx):
@@ -284,42 +1089,46 @@ async def reset_conversation(ctx):
     # Get active character for this channel
     active_char = active_characters.get(channel_id, "default")
     character = characters.get(active_char, characters["default"])
-    conversations[channel_id] = [
-        {"role": "system", "content": character["system_prompt"]}
-    ]
+    # Abort any reply still generating against the old history
+    cancel_generations(channel_id)
+    start_conversation(channel_id, character["system_prompt"])
+    forget_ensemble_histories(channel_id)
     await ctx.send(f"Conversation history has been reset! Active character: **{character['name']}**")
 
 @bot.command(name='system')
 async def set_system_prompt(ctx, *, prompt):
     """Set a custom system prompt for this channel"""
     channel_id = ctx.channel.id
-    conversations[channel_id] = [
-        {"role": "system", "content": prompt}
-    ]
+    # Abort any reply still generating against the old history
+    cancel_generations(channel_id)
+    start_conversation(channel_id, prompt)
+    forget_ensemble_histories(channel_id)
     
     # Save the prompt for persistence
-    saved_prompts[str(channel_id)] = prompt
-    save_system_prompts(saved_prompts)
+    save_prompt(channel_id, prompt)
     
     await ctx.send(f"System prompt updated: {prompt[:100]}{'...' if len(prompt) > 100 else ''}")
 
+def presets_embed():
+    embed = discord.Embed(
+        title="Available Preset Prompts",
+        description="Use `!preset <name>` to set a preset prompt:",
+        color=0x00ff00
+    )
+    for name, prompt in PRESET_PROMPTS.items():
+        embed.add_field(
+            name=f"**{name}**",
+            value=prompt[:100] + ("..." if len(prompt) > 100 else ""),
+            inline=False
+        )
+    return embed
+
 @bot.command(name='preset')
 async def set_preset_prompt(ctx, preset_name=None):
     """Set a preset system prompt for this channel"""
     if preset_name is None:
         # Show available presets
-        embed = discord.Embed(
-            title="Available Preset Prompts",
-            description="Use `!preset <name>` to set a preset prompt:",
-            color=0x00ff00
-        )
-        for name, prompt in PRESET_PROMPTS.items():
-            embed.add_field(
-                name=f"**{name}**",
-                value=prompt[:100] + ("..." if len(prompt) > 100 else ""),
-                inline=False
-            )
-        await ctx.send(embed=embed)
+        await ctx.send(embed=cached_embed("presets", None, presets_embed))
         return
     
     preset_name = preset_name.lower()
@@ -329,13 +1138,13 @@ async def set_preset_prompt(ctx, preset_name=None):
     
     channel_id = ctx.channel.id
     prompt = PRESET_PROMPTS[preset_name]
-    conversations[channel_id] = [
-        {"role": "system", "content": prompt}
-    ]
+    # Abort any reply still generating against the old history
+    cancel_generations(channel_id)
+    start_conversation(channel_id, prompt)
+    forget_ensemble_histories(channel_id)
     
     # Save the prompt for persistence
-    saved_prompts[str(channel_id)] = prompt
-    save_system_prompts(saved_prompts)
+    save_prompt(channel_id, prompt)
     
     await ctx.send(f"System prompt set to **{preset_name}**: {prompt[:100]}{'...' if len(prompt) > 100 else ''}")
 
@@ -357,6 +1166,52 @@ async def show_current_prompt(ctx):
     embed.set_footer(text=f"Channel ID: {channel_id}")
     await ctx.send(embed=embed)
 
+@bot.command(name='memory')
+async def show_memory(ctx, action=None):
+    """Show this channel's long-term memory size, or wipe it with !memory forget"""
+    if not long_term_memory:
+        await ctx.send("❌ Long-term memory is disabled (set MEMORY_DIR to enable it).")
+        return
+    channel_id = ctx.channel.id
+    
+    if action == "forget":
+        await asyncio.to_thread(long_term_memory.forget, channel_id)
+        await ctx.send("🧹 Long-term memory for this channel has been erased.")
+        return
+    
+    stats = await asyncio.to_thread(long_term_memory.stats, channel_id)
+    await ctx.send(f"🧠 Long-term memory: {stats['entries']} exchanges, {stats['bytes'] / 1024:.1f} KB on disk. "
+                   f"Up to {MEMORY_TOP_K} relevant ones are recalled per reply.")
+
+@bot.command(name='usage')
+async def show_usage(ctx):
+    """Show how much memory conversation state uses, for this channel and in total"""
+    if not hasattr(conversations, "usage"):
+        await ctx.send("❌ Memory accounting needs idle eviction (CONVERSATION_IDLE_SECONDS > 0, no BOT_STATE_DB).")
+        return
+    usage = await asyncio.to_thread(state_usage)
+    hot, cold = usage.get(ctx.channel.id, (0, 0))
+    total_hot = sum(h for h, _ in usage.values())
+    total_cold = sum(c for _, c in usage.values())
+    active = sum(1 for h, _ in usage.values() if h)
+    rss = process_rss()
+    embed = discord.Embed(title="📦 Conversation Memory", color=0x00aaff)
+    embed.add_field(
+        name="This channel",
+        value=f"{hot / 1024:.1f} KB in memory" if hot else (f"Idle: {cold / 1024:.1f} KB compressed" if cold else "No history"),
+        inline=False
+    )
+    embed.add_field(
+        name="All channels",
+        value=f"{active} active: {total_hot / 1024:.1f} KB in memory\n"
+              f"{len(usage) - active} idle: {total_cold / 1024:.1f} KB compressed {'on disk' if COLD_STORE_DIR else 'in memory'}",
+        inline=False
+    )
+    if rss:
+        embed.add_field(name="Process RSS", value=f"{rss / 1024 / 1024:.1f} MB", inline=False)
+    embed.set_footer(text=f"Channels idle for {CONVERSATION_IDLE_SECONDS:g}s are compressed")
+    await ctx.send(embed=embed)
+
 @bot.command(name='character')
 async def switch_character(ctx, character_name=None):
     """Switch to a different character or show current character"""
@@ -389,10 +1244,11 @@ async def switch_character(ctx, character_name=None):
     active_characters[channel_id] = character_name
     character = characters[character_name]
     
+    # Abort any reply still generating against the old history
+    cancel_generations(channel_id)
+    
     # Reset conversation with new character
-    conversations[channel_id] = [
-        {"role": "system", "content": character["system_prompt"]}
-    ]
+    start_conversation(channel_id, character["system_prompt"])
     
     embed = discord.Embed(
         title=f"Switched to: {character['name']}",
@@ -404,17 +1260,117 @@ async def switch_character(ctx, character_name=None):
     embed.add_field(name="Model", value=character['model'], inline=True)
     await ctx.send(embed=embed)
 
-@bot.command(name='characters')
-async def list_characters(ctx):
-    """List all available characters"""
+@bot.command(name='ensemble')
+async def set_ensemble(ctx, *character_names):
+    """Have several characters answer every message at once. Format: !ensemble scholar zizek sage | !ensemble off"""
+    channel_id = ctx.channel.id
+    
+    if not character_names:
+        if channel_id in ensembles:
+            names = ", ".join(f"**{characters[c]['name']}** ({c})" for c in ensembles[channel_id] if c in characters)
+            await ctx.send(f"Ensemble active: {names}\nUse `!ensemble off` to return to a single character.")
+        else:
+            await ctx.send("No ensemble active. Use `!ensemble <name> <name> ...` to start one.")
+        return
+    
+    if len(character_names) == 1 and character_names[0].lower() == "off":
+        if channel_id in ensembles:
+            forget_ensemble_histories(channel_id)
+            del ensembles[channel_id]
+        await ctx.send("Ensemble mode off. Back to a single character.")
+        return
+    
+    members = []
+    for name in character_names:
+        name = name.lower()
+        if name not in characters:
+            await ctx.send(f"Character '{name}' not found. Use `!characters` to see available characters.")
+            return
+        if name not in members:
+            members.append(name)
+    
+    if not (2 <= len(members) <= MAX_ENSEMBLE_SIZE):
+        await ctx.send(f"An ensemble needs between 2 and {MAX_ENSEMBLE_SIZE} different characters.")
+        return
+    
+    # Start every panel character with a fresh history, dropping the previous panel's
+    forget_ensemble_histories(channel_id)
+    for char_id in members:
+        start_conversation(f"{channel_id}/{char_id}", characters[char_id]["system_prompt"])
+    ensembles[channel_id] = members
+    
+    names = ", ".join(f"**{characters[c]['name']}** ({characters[c]['model']})" for c in members)
+    await ctx.send(f"🎭 Ensemble active: {names}\nEach message now gets a reply from every character.")
+
+@bot.command(name='debate')
+async def start_debate(ctx, turns: int, speakers, *, topic):
+    """Have characters converse with each other. Format: !debate 6 zizek,scholar The death of the author"""
+    channel_id = ctx.channel.id
+    
+    if channel_id in dialogues:
+        await ctx.send("A dialogue is already running here. Use `!stop_debate` to end it.")
+        return
+    if not (1 <= turns <= MAX_DIALOGUE_TURNS):
+        await ctx.send(f"Turns must be between 1 and {MAX_DIALOGUE_TURNS}.")
+        return
+    
+    speaker_ids = [name.strip().lower() for name in speakers.split(',') if name.strip()]
+    for char_id in speaker_ids:
+        if char_id not in characters:
+            await ctx.send(f"Character '{char_id}' not found. Use `!characters` to see available characters.")
+            return
+    if len(speaker_ids) < 2:
+        await ctx.send("A dialogue needs at least two characters, separated by commas (e.g. `zizek,scholar`).")
+        return
+    
+    # Speakers keep the character versions they started with, even across a hot reload
+    dialogue = Dialogue(ai_client, [(char_id, characters[char_id]) for char_id in speaker_ids], topic, turns,
+                        executor=llm_executor, load_shedder=load_shedder)
+    dialogues[channel_id] = dialogue
+    names = " vs ".join(characters[char_id]["name"] for char_id in speaker_ids)
+    await ctx.send(f"🎙️ **{names}** on *{topic}* ({turns} turns). Type in the channel to interject, `!stop_debate` to end.")
+    
+    async def post(char_id, character, text):
+        await send_long(ctx.channel, f"**{character['name']}:** {text}")
+    
+    try:
+        await dialogue.run(post)
+        await ctx.send("🎙️ Dialogue stopped." if dialogue.stopped else "🎙️ Dialogue finished.")
+    except Overloaded as e:
+        await ctx.send(str(e))
+    except Exception as e:
+        await ctx.send(f"Sorry, the dialogue encountered an error: {str(e)}")
+        log.error("dialogue_failed", channel=channel_id, error=str(e))
+    finally:
+        if dialogues.get(channel_id) is dialogue:
+            del dialogues[channel_id]
+
+@bot.command(name='stop_debate')
+async def stop_debate(ctx):
+    """Stop the dialogue running in this channel"""
+    dialogue = dialogues.get(ctx.channel.id)
+    if dialogue is None:
+        await ctx.send("No dialogue is running in this channel.")
+        return
+    dialogue.stop()
+
+@bot.command(name='interject')
+async def interject(ctx, *, message):
+    """Add your message to the dialogue running in this channel"""
+    dialogue = dialogues.get(ctx.channel.id)
+    if dialogue is None:
+        await ctx.send("No dialogue is running in this channel.")
+        return
+    dialogue.interject(ctx.author.display_name, message)
+    await ctx.message.add_reaction("💬")
+
+def characters_embed(current_char):
     embed = discord.Embed(
         title="Available Characters",
         description="Use `!character <name>` to switch to a character",
         color=0x9966ff
     )
     
-    current_char = active_characters.get(ctx.channel.id, "default")
-    
     for char_id, char_data in characters.items():
         status = " 🔹 **ACTIVE**" if char_id == current_char else ""
         embed.add_field(
@@ -423,6 +1379,15 @@ async def list_characters(ctx):
             inline=False
         )
     
+    embed.set_footer(text=f"Characters version {characters_version}")
+    return embed
+
+@bot.command(name='characters')
+async def list_characters(ctx):
+    """List all available characters"""
+    current_char = active_characters.get(ctx.channel.id, "default")
+    # One cached variant per active character
+    embed = cached_embed(("characters", current_char), characters_version, lambda: characters_embed(current_char))
     await ctx.send(embed=embed)
 
 @bot.command(name='create_character')
@@ -454,6 +1419,10 @@ async def create_character(ctx, char_id, name, temperature: float, max_tokens: i
         if model not in available_models:
             await ctx.send(f"Model '{model}' not supported. Available models: {', '.join(available_models)}")
             return
+        problems = ai_client.catalog.problems(model, max_tokens)
+        if problems:
+            await ctx.send(f"❌ {problems[0]}. Use `!models` to see available models.")
+            return
         
         # Create new character
         new_character = {
@@ -508,9 +1477,49 @@ async def delete_character(ctx, char_id):
     
     await ctx.send(f"Deleted character '{character_name}' ({char_id}). Channels using this character have been switched to default.")
 
-@bot.command(name='models')
-async def list_models(ctx):
-    """List all available AI models grouped by provider"""
+@bot.command(name='load')
+async def show_load(ctx):
+    """Show current load, provider latency and each character's degradation level"""
+    status = load_shedder.status(characters)
+    embed = discord.Embed(
+        title="📈 Current Load",
+        description=f"Requests in flight: **{status['in_flight']}**",
+        color=0x00aaff
+    )
+    latency = "\n".join(f"• {provider}: {seconds:.1f}s" for provider, seconds in status["latency"].items())
+    embed.add_field(name="Recent latency (p90)", value=latency or "No recent requests", inline=False)
+    degraded = "\n".join(f"• {char_id}: {level}" for char_id, level in status["levels"].items() if level != LEVEL_NAMES[0])
+    embed.add_field(name="Degraded characters", value=degraded or "None — all characters at full service", inline=False)
+    await ctx.send(embed=embed)
+
+@bot.command(name='budget')
+async def show_budget(ctx):
+    """Show learned max_tokens per character and model, and how much reserved budget it saved"""
+    report = reply_budget.report({char_id: c["max_tokens"] for char_id, c in characters.items()})
+    embed = discord.Embed(
+        title="🎯 Adaptive max_tokens",
+        description=f"Saved **{report['saved']:,}** reserved tokens over {report['requests']:,} requests"
+                    + ("" if report["enabled"] else " (disabled: ADAPTIVE_MAX_TOKENS=0)"),
+        color=0x00aaff
+    )
+    lines = []
+    for row in report["rows"][:20]:
+        budget = f"{min(row['learned'], row['cap'] or row['learned'])} of {row['cap']}" if row["learned"] else f"learning ({row['samples']}/{reply_budget.min_samples})"
+        name = characters[row["character"]]["name"] if row["character"] in characters else row["character"]
+        lines.append(f"• **{name}** ({row['character']}) `{row['model']}`: {budget}, saved {row['saved']:,}"
+                     + (f", {row['truncated']} truncated" if row["truncated"] else ""))
+    embed.add_field(name="Per character", value="\n".join(lines) or "No replies yet", inline=False)
+    embed.set_footer(text=f"Reserved but unused: {report['unused']:,} tokens")
+    await ctx.send(embed=embed)
+
+def model_note(model):
+    """Short catalog summary shown next to a model in !models (context size or a warning)"""
+    if not ai_client.catalog.is_available(model):
+        return " ⚠️ unavailable"
+    context_length = ai_client.catalog.context_length(model)
+    return f" ({context_length // 1000}k context)" if context_length else ""
+
+def models_embed():
     models = ai_client.get_available_models()
     
     embed = discord.Embed(
@@ -526,17 +1535,23 @@ async def list_models(ctx):
                 "anthropic": "🔵 Anthropic (Claude)",
                 "openrouter": "🟡 OpenRouter",
                 "groq": "⚡ Groq",
-                "grok": "🟠 Grok (X.AI)"
+                "grok": "🟠 Grok (X.AI)",
+                "local": "🖥️ Local"
             }.get(provider, provider.title())
             
             embed.add_field(
                 name=provider_name,
-                value="\n".join([f"• `{model}`" for model in model_list]),
+                value="\n".join([f"• `{model}`{model_note(model)}" for model in model_list]),
                 inline=False
             )
     
     embed.set_footer(text="Use these model names when creating characters or switching models")
-    await ctx.send(embed=embed)
+    return embed
+
+@bot.command(name='models')
+async def list_models(ctx):
+    """List all available AI models grouped by provider"""
+    await ctx.send(embed=cached_embed("models", ai_client.catalog.version, models_embed))
 
 @bot.command(name='switch_model')
 async def switch_model(ctx, character_id, new_model):
@@ -552,6 +1567,10 @@ async def switch_model(ctx, character_id, new_model):
     if new_model not in available_models:
         await ctx.send(f"Model '{new_model}' not supported. Use `!models` to see available models.")
         return
+    problems = ai_client.catalog.problems(new_model, characters[character_id]["max_tokens"])
+    if problems:
+        await ctx.send(f"❌ {problems[0]}. Use `!models` to see available models.")
+        return
     
     # Update character model
     old_model = characters[character_id]["model"]
@@ -561,9 +1580,8 @@ async def switch_model(ctx, character_id, new_model):
     # If this character is active in current channel, reset conversation
     channel_id = ctx.channel.id
     if active_characters.get(channel_id) == character_id:
-        conversations[channel_id] = [
-            {"role": "system", "content": characters[character_id]["system_prompt"]}
-        ]
+        cancel_generations(channel_id)
+        start_conversation(channel_id, characters[character_id]["system_prompt"])
     
     character_name = characters[character_id]["name"]
     await ctx.send(f"✅ Switched **{character_name}** ({character_id}) from `{old_model}` to `{new_model}`\nConversation history reset for this character.")
@@ -580,136 +1598,59 @@ async def follow_up(ctx, *, follow_up_message):
     
     last_response = last_bot_responses[channel_id]
     
-    # Initialize conversation if needed
-    if channel_id not in conversations:
-        active_char = active_characters.get(channel_id, "default")
-        character = characters.get(active_char, characters["default"])
-        conversations[channel_id] = [
-            {"role": "system", "content": character["system_prompt"]}
-        ]
-    
     # Create a follow-up prompt that references the last response
     follow_up_prompt = f"Regarding your previous response: \"{last_response[:200]}{'...' if len(last_response) > 200 else ''}\"\n\n{follow_up_message}"
     
-    # Add the follow-up message to conversation
-    conversations[channel_id].append({"role": "user", "content": follow_up_prompt})
-    
-    # Show typing indicator
-    async with ctx.typing():
-        try:
-            # Get active character for this channel
-            active_char = active_characters.get(channel_id, "default")
-            character = characters.get(active_char, characters["default"])
-            
-            # Get response from AI with character parameters
-            response = ai_client.chat_completion(
-                model=character["model"],
-                messages=conversations[channel_id],
-                max_tokens=character["max_tokens"],
-                temperature=character["temperature"]
-            )
-            
-            # Extract the assistant's response
-            assistant_message = response.content
-            
-            # Add assistant's response to conversation
-            conversations[channel_id].append({"role": "assistant", "content": assistant_message})
-            
-            # Store last bot response for follow-up command
-            last_bot_responses[channel_id] = assistant_message
-            
-            # Keep conversation history manageable (last 20 messages)
-            if len(conversations[channel_id]) > 21:  # 1 system + 20 messages
-                conversations[channel_id] = [conversations[channel_id][0]] + conversations[channel_id][-20:]
-            
-            # Split long messages if needed (Discord has 2000 char limit)
-            if len(assistant_message) > 2000:
-                for i in range(0, len(assistant_message), 2000):
-                    await ctx.send(assistant_message[i:i+2000])
-            else:
-                await ctx.send(assistant_message)
-                
-        except Exception as e:
-            await ctx.send(f"Sorry, I encountered an error: {str(e)}")
-            print(f"Error: {e}")
+    await respond(ctx.channel, channel_id, follow_up_prompt, ctx.message.id)
 
 @bot.command(name='continue_chat')
 async def continue_response(ctx):
     """Ask the bot to continue or elaborate on its last response"""
     channel_id = ctx.channel.id
+    await rehydrate(channel_id)
     
     # Check if there's a previous bot response
     if channel_id not in last_bot_responses:
         await ctx.send("❌ No previous bot response found in this channel. Chat with me first!")
         return
     
-    # Debug: Check what we have stored
-    print(f"DEBUG: Channel {channel_id} has last response: {last_bot_responses[channel_id][:50]}...")
-    
     last_response = last_bot_responses[channel_id]
     
-    # Initialize conversation if needed
-    if channel_id not in conversations:
-        active_char = active_characters.get(channel_id, "default")
-        character = characters.get(active_char, characters["default"])
-        conversations[channel_id] = [
-            {"role": "system", "content": character["system_prompt"]}
-        ]
-    
     # Create a continuation prompt that references the previous response
-    continue_prompt = f"Please continue or elaborate on your previous response. For context, your last response was: \"{last_response[:200]}{'...' if len(last_response) > 200 else ''}\""
-    
-    # Add the continuation request to conversation
-    conversations[channel_id].append({"role": "user", "content": continue_prompt})
+    continue_prompt = continuation_prompt(last_response)
     
-    # Show typing indicator
-    async with ctx.typing():
+    # Answer from the background continuation if it was started for this very reply
+    pending = continuations.pop(channel_id, None)
+    history = conversations.get(channel_id, [])
+    if pending and pending["after"] == last_response and history and history[-1] == {"role": "assistant", "content": last_response}:
         try:
-            # Get active character for this channel
-            active_char = active_characters.get(channel_id, "default")
-            character = characters.get(active_char, characters["default"])
-            
-            # Get response from AI with character parameters
-            response = ai_client.chat_completion(
-                model=character["model"],
-                messages=conversations[channel_id],
-                max_tokens=character["max_tokens"],
-                temperature=character["temperature"]
-            )
-            
-            # Extract the assistant's response
-            assistant_message = response.content
-            
-            # Add assistant's response to conversation
-            conversations[channel_id].append({"role": "assistant", "content": assistant_message})
-            
-            # Store last bot response for follow-up command
-            last_bot_responses[channel_id] = assistant_message
-            
-            # Keep conversation history manageable (last 20 messages)
-            if len(conversations[channel_id]) > 21:  # 1 system + 20 messages
-                conversations[channel_id] = [conversations[channel_id][0]] + conversations[channel_id][-20:]
-            
-            # Split long messages if needed (Discord has 2000 char limit)
-            if len(assistant_message) > 2000:
-                for i in range(0, len(assistant_message), 2000):
-                    await ctx.send(assistant_message[i:i+2000])
-            else:
-                await ctx.send(assistant_message)
-                
-        except Exception as e:
-            await ctx.send(f"Sorry, I encountered an error: {str(e)}")
-            print(f"Error: {e}")
+            async with ctx.channel.typing():
+                response = await pending["task"]
+        except (asyncio.CancelledError, Exception):
+            # Failed, cancelled or rejected: fall back to a fresh request
+            response = None
+        if response is not None:
+            append_to_conversation(channel_id, "user", continue_prompt)
+            append_to_conversation(channel_id, "assistant", response.content)
+            last_bot_responses[channel_id] = response.content
+            await send_long(ctx.channel, response.content)
+            if response.truncated:
+                precompute_continuation(channel_id, *active_character(channel_id), response.content)
+            return
+    elif pending:
+        pending["task"].cancel()
+    
+    await respond(ctx.channel, channel_id, continue_prompt, ctx.message.id)
 
 @bot.command(name='more')
 async def continue_alias(ctx):
     """Alias for continue_chat - ask the bot to continue its last response"""
     await continue_response(ctx)
 
-@bot.command(name='guide')
-async def help_command(ctx, section=None):
-    """Show comprehensive bot help and instructions"""
-    
+# Sections of !guide (None is the overview)
+GUIDE_SECTIONS = (None, "characters", "chat", "custom", "examples")
+
+def guide_embed(section):
     if section is None:
         # Main help overview
         embed = discord.Embed(
@@ -738,9 +1679,9 @@ async def help_command(ctx, section=None):
             inline=False
         )
         embed.set_footer(text="Use !guide <section> for detailed information on each area")
-        await ctx.send(embed=embed)
+        return embed
 
-    elif section.lower() == "characters":
+    elif section == "characters":
         embed = discord.Embed(
             title="🎭 Character System",
             description="Switch between AI personalities with different parameters",
@@ -748,7 +1689,7 @@ async def help_command(ctx, section=None):
         )
         embed.add_field(
             name="**Character Commands**",
-            value="`!character` - Show current character\n`!character <name>` - Switch to character\n`!characters` - List all characters\n`!models` - List available AI models\n`!switch_model <char> <model>` - Change character's model",
+            value="`!character` - Show current character\n`!character <name>` - Switch to character\n`!characters` - List all characters\n`!ensemble <names...>` - Several characters answer at once\n`!debate <turns> <a,b,...> <topic>` - Characters debate each other\n`!models` - List available AI models\n`!switch_model <char> <model>` - Change character's model",
             inline=False
         )
         embed.add_field(
@@ -762,9 +1703,9 @@ async def help_command(ctx, section=None):
             inline=False
         )
         embed.set_footer(text="Each channel remembers its active character!")
-        await ctx.send(embed=embed)
+        return embed
 
-    elif section.lower() == "chat":
+    elif section == "chat":
         embed = discord.Embed(
             title="💬 Chat Commands",
             description="How to interact with the AI bot",
@@ -786,9 +1727,9 @@ async def help_command(ctx, section=None):
             inline=False
         )
         embed.set_footer(text="Pro tip: Create different channels for different topics!")
-        await ctx.send(embed=embed)
+        return embed
 
-    elif section.lower() == "custom":
+    elif section == "custom":
         embed = discord.Embed(
             title="⚙️ Customization",
             description="Create characters, set prompts, and personalize your experience",
@@ -815,9 +1756,9 @@ async def help_command(ctx, section=None):
             inline=False
         )
         embed.set_footer(text="All customizations are saved and persist after bot restart!")
-        await ctx.send(embed=embed)
+        return embed
 
-    elif section.lower() == "examples":
+    elif section == "examples":
         embed = discord.Embed(
             title="📚 Usage Examples",
             description="Real examples of how to use the bot effectively",
@@ -843,16 +1784,185 @@ async def help_command(ctx, section=None):
             value="• Use **scholar** for research and detailed explanations\n• Use **creative** for writing, brainstorming, art\n• Use **analyst** for problem-solving and logic\n• Use `!follow` and `!more` for deeper conversations\n• Create custom characters for specific use cases",
             inline=False
         )
-        await ctx.send(embed=embed)
+        return embed
 
-    else:
+@bot.command(name='guide')
+async def help_command(ctx, section=None):
+    """Show comprehensive bot help and instructions"""
+    section = section.lower() if section else None
+    if section not in GUIDE_SECTIONS:
         await ctx.send(f"Unknown help section: `{section}`. Use `!guide` to see available sections.")
+        return
+    await ctx.send(embed=cached_embed(("guide", section), None, lambda: guide_embed(section)))
 
 @bot.command(name='help_bot')
 async def help_bot_alias(ctx):
     """Alias for the main help command"""
     await help_command(ctx)
 
+class InteractionMessage:
+    """Stands in for the command message of an interaction: a reaction becomes a follow-up"""
+    
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.id = ctx.interaction.id
+    
+    async def add_reaction(self, emoji):
+        await self.ctx.send(emoji)
+
+class InteractionContext:
+    """Enough of commands.Context for the command handlers to answer a deferred interaction.
+    
+    Doubles as its own channel: replies go out as follow-ups to the interaction, and the
+    deferred "thinking..." state stands in for the typing indicator.
+    """
+    
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.id = interaction.channel_id
+        self.channel = self
+        self.message = InteractionMessage(self)
+        self.author = interaction.user
+        self.command = None
+        self.replied = False
+    
+    async def send(self, content=None, **kwargs):
+        self.replied = True
+        await self.interaction.followup.send(content, **kwargs)
+    
+    @asynccontextmanager
+    async def typing(self):
+        yield
+
+if SLASH_COMMANDS:
+    async def refuse_while_shutting_down(interaction):
+        if shutting_down:
+            await interaction.response.send_message("🔄 Restarting, try again in a few seconds.", ephemeral=True)
+        return not shutting_down
+    bot.tree.interaction_check = refuse_while_shutting_down
+    
+    # Defer first: Discord requires an acknowledgement within 3 seconds, replies can take longer
+    
+    @bot.tree.command(name="chat", description="Chat with this channel's character")
+    async def slash_chat(interaction: discord.Interaction, message: str):
+        await interaction.response.defer(thinking=True)
+        await chat(InteractionContext(interaction), message=message)
+    
+    @bot.tree.command(name="more", description="Continue the last response")
+    async def slash_more(interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        await continue_response(InteractionContext(interaction))
+    
+    @bot.tree.command(name="reset", description="Reset this channel's conversation history")
+    async def slash_reset(interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        await reset_conversation(InteractionContext(interaction))
+    
+    @bot.tree.command(name="character", description="Show or switch this channel's character")
+    async def slash_character(interaction: discord.Interaction, name: str = None):
+        await interaction.response.defer(thinking=True)
+        await switch_character(InteractionContext(interaction), name)
+    
+    @bot.tree.command(name="characters", description="List available characters")
+    async def slash_characters(interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        await list_characters(InteractionContext(interaction))
+    
+    @bot.tree.command(name="models", description="List available AI models")
+    async def slash_models(interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        await list_models(InteractionContext(interaction))
+    
+    @bot.tree.command(name="follow", description="Ask the character to follow up on its last response")
+    async def slash_follow(interaction: discord.Interaction, message: str):
+        await interaction.response.defer(thinking=True)
+        await follow_up(InteractionContext(interaction), follow_up_message=message)
+    
+    @bot.tree.command(name="system", description="Set a custom system prompt for this channel")
+    async def slash_system(interaction: discord.Interaction, prompt: str):
+        await interaction.response.defer(thinking=True)
+        await set_system_prompt(InteractionContext(interaction), prompt=prompt)
+    
+    @bot.tree.command(name="preset", description="List preset prompts or switch this channel to one")
+    async def slash_preset(interaction: discord.Interaction, name: str = None):
+        await interaction.response.defer(thinking=True)
+        await set_preset_prompt(InteractionContext(interaction), name)
+    
+    @bot.tree.command(name="prompt", description="Show this channel's system prompt")
+    async def slash_prompt(interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        await show_current_prompt(InteractionContext(interaction))
+    
+    @bot.tree.command(name="window", description="Merge rapid-fire messages into one turn")
+    async def slash_window(interaction: discord.Interaction, seconds: float = None, scope: str = None, busy: str = None):
+        await interaction.response.defer(thinking=True)
+        await set_window(InteractionContext(interaction), seconds, scope, busy)
+    
+    @bot.tree.command(name="ensemble", description="Have several characters answer every message (names separated by spaces, or off)")
+    async def slash_ensemble(interaction: discord.Interaction, names: str = None):
+        await interaction.response.defer(thinking=True)
+        await set_ensemble(InteractionContext(interaction), *(names.split() if names else ()))
+    
+    @bot.tree.command(name="debate", description="Have characters converse with each other")
+    async def slash_debate(interaction: discord.Interaction, turns: int, speakers: str, topic: str):
+        await interaction.response.defer(thinking=True)
+        await start_debate(InteractionContext(interaction), turns, speakers, topic=topic)
+    
+    @bot.tree.command(name="stop_debate", description="Stop the dialogue running in this channel")
+    async def slash_stop_debate(interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        ctx = InteractionContext(interaction)
+        await stop_debate(ctx)
+        if not ctx.replied:
+            await ctx.send("🎙️ Stopping the dialogue.")
+    
+    @bot.tree.command(name="interject", description="Add your message to the running dialogue")
+    async def slash_interject(interaction: discord.Interaction, message: str):
+        await interaction.response.defer(thinking=True)
+        await interject(InteractionContext(interaction), message=message)
+    
+    @bot.tree.command(name="create_character", description="Create a new character")
+    async def slash_create_character(interaction: discord.Interaction, character_id: str, name: str, temperature: float,
+                                     max_tokens: int, model: str, description: str, system_prompt: str):
+        await interaction.response.defer(thinking=True)
+        await create_character(InteractionContext(interaction), character_id, name, temperature, max_tokens, model,
+                               description_and_prompt=f"{description} | {system_prompt}")
+    
+    @bot.tree.command(name="delete_character", description="Delete a custom character")
+    async def slash_delete_character(interaction: discord.Interaction, character_id: str):
+        await interaction.response.defer(thinking=True)
+        await delete_character(InteractionContext(interaction), character_id)
+    
+    @bot.tree.command(name="switch_model", description="Change the model a character uses")
+    async def slash_switch_model(interaction: discord.Interaction, character: str, model: str):
+        await interaction.response.defer(thinking=True)
+        await switch_model(InteractionContext(interaction), character, model)
+    
+    @bot.tree.command(name="load", description="Show current load and degraded characters")
+    async def slash_load(interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        await show_load(InteractionContext(interaction))
+    
+    @bot.tree.command(name="budget", description="Show learned max_tokens per character and model")
+    async def slash_budget(interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        await show_budget(InteractionContext(interaction))
+    
+    @bot.tree.command(name="usage", description="Show how much memory conversation state uses")
+    async def slash_usage(interaction: discord.Interaction):
+        await interaction.response.defer(thinking=True)
+        await show_usage(InteractionContext(interaction))
+    
+    @bot.tree.command(name="memory", description="Show this channel's long-term memory, or erase it with action forget")
+    async def slash_memory(interaction: discord.Interaction, action: str = None):
+        await interaction.response.defer(thinking=True)
+        await show_memory(InteractionContext(interaction), action)
+    
+    @bot.tree.command(name="guide", description="Show the bot guide, or one section of it")
+    async def slash_guide(interaction: discord.Interaction, section: str = None):
+        await interaction.response.defer(thinking=True)
+        await help_command(InteractionContext(interaction), section)
+
 # Error handling
 @bot.event
 async def on_command_error(ctx, error):
@@ -862,16 +1972,123 @@ async def on_command_error(ctx, error):
         await ctx.send("Command not found. Use `!help_bot` to see available commands.")
     else:
         await ctx.send(f"An error occurred: {str(error)}")
-        print(f"Error: {error}")
+        log.error("command_failed", command=ctx.command.name if ctx.command else None, error=str(error))
+
+# Graceful shutdown: on SIGTERM/SIGINT stop taking messages, let in-flight replies finish for
+# up to SHUTDOWN_DEADLINE seconds (a second signal cuts this short), cancel the rest, and
+# checkpoint in-memory channel state to CHECKPOINT_FILE for the next process to resume from
+SHUTDOWN_DEADLINE = float(os.getenv("SHUTDOWN_DEADLINE", "20"))
+CHECKPOINT_FILE = os.getenv("CHECKPOINT_FILE", f"bot_checkpoint{'-' + SHARD_IDS if SHARD_IDS else ''}.json")
+shutting_down = False
+shutdown_deadline = None
+shutdown_task = None
+
+def checkpoint_tables():
+    """Channel state that lives only in this process (none with a shared BOT_STATE_DB)"""
+    if state_store:
+        return {}
+    return {
+        "conversations": conversations,
+        "last_bot_responses": last_bot_responses,
+        "active_characters": active_characters,
+        "ensembles": ensembles,
+        "aggregation": aggregation
+    }
+
+def checkpoint_state():
+    """Atomically write in-memory state to CHECKPOINT_FILE"""
+    state = {"reply_budget": reply_budget.state()}
+    for name, table in checkpoint_tables().items():
+        if COLD_STORE_DIR and hasattr(table, "evict_idle"):
+            # Already backed by disk: evicting everything persists it
+            table.evict_idle(0)
+            continue
+        # Key/value pairs keep integer channel IDs intact through JSON
+        state[name] = [[key, table[key]] for key in table]
+    tmp_path = CHECKPOINT_FILE + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+def restore_checkpoint():
+    """Load the state a previous process checkpointed, then remove the file so it is used once"""
+    if not os.path.exists(CHECKPOINT_FILE):
+        return
+    try:
+        with open(CHECKPOINT_FILE, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        log.error("checkpoint_restore_failed", file=CHECKPOINT_FILE, error=str(e))
+        return
+    tables = checkpoint_tables()
+    for name, pairs in state.items():
+        if name in tables:
+            for key, value in pairs:
+                tables[name][key] = value
+    reply_budget.restore(state.get("reply_budget", []))
+    os.remove(CHECKPOINT_FILE)
+    log.info("checkpoint_restored", file=CHECKPOINT_FILE, channels=len(state.get("conversations", [])))
+
+def request_shutdown(sig):
+    global shutdown_deadline, shutdown_task
+    if shutting_down:
+        # Second signal: stop waiting for in-flight replies
+        shutdown_deadline = 0
+        return
+    shutdown_task = asyncio.create_task(shutdown(signal.Signals(sig).name))
+
+async def shutdown(reason):
+    """Drain or cancel in-flight work, checkpoint state and disconnect"""
+    global shutting_down, shutdown_deadline
+    shutting_down = True
+    shutdown_deadline = time.monotonic() + SHUTDOWN_DEADLINE
+    log.info("shutdown_started", reason=reason, in_flight=len(generations), deadline_s=SHUTDOWN_DEADLINE)
+    
+    # Debounced turns still fire and get answered; dialogues would go on for many turns
+    for dialogue in dialogues.values():
+        dialogue.stop()
+    # Finished replies still have their long-term memory writes to complete
+    while (generations or pending_turns or answering_turns or memory_writes) and time.monotonic() < shutdown_deadline:
+        await asyncio.sleep(0.1)
+    
+    cancelled = 0
+    for channel_id in {channel_id for channel_id, *_ in list(generations.values())}:
+        cancelled += cancel_generations(channel_id)
+    for channel_id in list(continuations):
+        discard_continuation(channel_id)
+    llm_executor.shutdown(wait=False, cancel_futures=True)
+    
+    try:
+        checkpoint_state()
+    except Exception as e:
+        log.error("checkpoint_failed", file=CHECKPOINT_FILE, error=str(e))
+    if state_store:
+        # Commit queued state writes before the next process reads the database
+        await asyncio.to_thread(state_store.close)
+    if recorder:
+        recorder.close()
+    log.info("shutdown_complete", cancelled=cancelled, checkpoint=CHECKPOINT_FILE)
+    await bot.close()
+
+async def run_bot(token):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, request_shutdown, sig)
+        except NotImplementedError:
+            # Windows: Ctrl+C still stops the bot, just without draining
+            pass
+    async with bot:
+        await bot.start(token)
 
 if __name__ == '__main__':
     discord_token = os.getenv("DISCORD_BOT_TOKEN")
-    if not discord_token:
-        print("Error: DISCORD_BOT_TOKEN not found in environment variables")
-        exit(1)
     
-    if not os.getenv("OPENAI_API_KEY"):
-        print("Error: OPENAI_API_KEY not found in environment variables")
+    # Any single provider is enough (e.g. a Groq-only deployment)
+    if not ai_client.configured_providers():
+        log.error("no_provider_configured")
         exit(1)
     
-    bot.run(discord_token)
\ No newline at end of file
+    restore_checkpoint()
+    # discord.py logs through our queue-backed handler (bot.start() installs none of its own)
+    asyncio.run(run_bot(discord_token))
\ No newline at end of file
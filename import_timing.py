@@ -0,0 +1,34 @@
+"""
+Import cost tracking for the startup-time log (see the "ready" event in discord_bot.py).
+
+Kept dependency-free so it can be imported first and time everything after it.
+"""
+
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+# Seconds spent importing each module (or group of imports), in import order
+IMPORT_TIMES: Dict[str, float] = {}
+
+# Process start reference point for "time to ready" reporting
+STARTED_AT = time.perf_counter()
+
+@contextmanager
+def import_timer(label: str):
+    """Record how long the imports inside the block take"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        IMPORT_TIMES[label] = IMPORT_TIMES.get(label, 0.0) + time.perf_counter() - start
+
+def lazy_import(module_name: str):
+    """Import a module on first use, recording the cost of the first import"""
+    module = sys.modules.get(module_name)
+    if module is None:
+        with import_timer(module_name):
+            module = importlib.import_module(module_name)
+    return module
@@ -0,0 +1,73 @@
+"""
+Launch the Discord bot as several shard processes sharing one SQLite state store.
+
+Each process runs discord_bot.py with its own contiguous range of shard IDs, so the
+bot scales across CPU cores and gateway connections. All processes share
+conversations and active characters through BOT_STATE_DB, and characters.json
+through hot reload.
+
+Usage:
+    python launch_shards.py --processes 4 [--shards 8] [--state-db bot_state.db]
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+# Discord allows one IDENTIFY per 5 seconds (without large bot sharding)
+IDENTIFY_INTERVAL = 5.0
+
+def shard_ranges(shard_count, processes):
+    """Split shard IDs 0..shard_count-1 into contiguous ranges, one per process"""
+    ranges = []
+    per_process, extra = divmod(shard_count, processes)
+    start = 0
+    for i in range(processes):
+        size = per_process + (1 if i < extra else 0)
+        if size:
+            ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Discord bot as multiple shard processes")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Number of bot processes to spawn")
+    parser.add_argument("--shards", type=int, default=None, help="Total shard count (defaults to one per process)")
+    parser.add_argument("--state-db", default=os.getenv("BOT_STATE_DB", "bot_state.db"), help="Shared SQLite state database")
+    args = parser.parse_args()
+
+    shard_count = args.shards or args.processes
+    if shard_count < args.processes:
+        parser.error("--shards must be at least --processes")
+
+    bot_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "discord_bot.py")
+    processes = []
+
+    def stop(signum, frame):
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signum)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for shard_ids in shard_ranges(shard_count, args.processes):
+        env = dict(os.environ)
+        env["SHARD_COUNT"] = str(shard_count)
+        env["SHARD_IDS"] = ",".join(str(shard_id) for shard_id in shard_ids)
+        env["BOT_STATE_DB"] = args.state_db
+        print(f"Starting shards {env['SHARD_IDS']} of {shard_count}")
+        processes.append(subprocess.Popen([sys.executable, bot_script], env=env))
+        # Stagger processes so their shards don't all IDENTIFY at once
+        time.sleep(IDENTIFY_INTERVAL * len(shard_ids))
+
+    exit_code = 0
+    for process in processes:
+        exit_code = process.wait() or exit_code
+    sys.exit(exit_code)
+
+if __name__ == '__main__':
+    main()
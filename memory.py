@@ -0,0 +1,190 @@
+"""
+Long-term per-channel memory with a local vector index.
+
+Past exchanges are embedded on the CPU with a hashing vectorizer (no model to
+download) and appended to a per-channel index on disk:
+
+    <dir>/<channel>.vec   float32 vectors, one row per stored exchange (memory-mapped)
+    <dir>/<channel>.txt   the exchange texts, UTF-8, back to back
+    <dir>/<channel>.off   uint64 start offset of each text in .txt
+
+Retrieval is a brute-force dot product over the memory-mapped vectors in chunks,
+so memory use stays flat as the index grows. Vectors stay float32 on disk: float16
+would halve the size, but converting it back costs more than the BLAS product.
+The top-k most similar snippets are injected into the prompt instead of sending
+the whole history. See bench_memory.py for index size and query time at scale.
+"""
+
+import os
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Vector dimensions; more means fewer hash collisions but a bigger index
+DEFAULT_DIM = 256
+
+# Rows scored per step, bounding the working set during a search
+SEARCH_CHUNK = 32768
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Too common to say anything about relevance
+STOP_WORDS = frozenset(
+    "a an and are as at be but by do for from has have i if in is it its me my no not "
+    "of on or so that the this to was we were what when which who will with you your".split()
+)
+
+class HashingEmbedder:
+    """Signed feature hashing of words and word bigrams, with sublinear weights and L2 norm"""
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        tokens = [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into an (n, dim) float32 array of unit vectors (zero rows for empty texts)"""
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self.features(text):
+                h = zlib.crc32(feature.encode())
+                rows.append(row)
+                cols.append(h % self.dim)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(vectors, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), np.array(signs, dtype=np.float32))
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+class ChannelMemory:
+    """Append-only vector index and text store for one channel"""
+
+    def __init__(self, directory: str, name: str, dim: int):
+        self.dim = dim
+        self.row_bytes = dim * 4  # float32
+        base = os.path.join(directory, name)
+        self.paths = {ext: f"{base}.{ext}" for ext in ("vec", "txt", "off")}
+        self.lock = threading.Lock()
+        self._map: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        # An entry exists once its offset is written, which happens last
+        sizes = {ext: os.path.getsize(path) if os.path.exists(path) else 0 for ext, path in self.paths.items()}
+        return min(sizes["vec"] // self.row_bytes, sizes["off"] // 8)
+
+    def size_on_disk(self) -> int:
+        return sum(os.path.getsize(path) for path in self.paths.values() if os.path.exists(path))
+
+    def add(self, texts: List[str], vectors: np.ndarray):
+        """Append texts with their embeddings"""
+        with self.lock:
+            count = len(self)
+            # Drop a partial write left by a crash so rows, texts and offsets stay aligned
+            for ext, size in (("vec", count * self.row_bytes), ("off", count * 8)):
+                if os.path.exists(self.paths[ext]) and os.path.getsize(self.paths[ext]) != size:
+                    os.truncate(self.paths[ext], size)
+
+            encoded = [text.encode() for text in texts]
+            with open(self.paths["txt"], 'ab') as f:
+                start = f.tell()
+                f.write(b"".join(encoded))
+            offsets = start + np.cumsum([0] + [len(data) for data in encoded[:-1]], dtype=np.uint64)
+            with open(self.paths["vec"], 'ab') as f:
+                f.write(vectors.astype(np.float32).tobytes())
+            with open(self.paths["off"], 'ab') as f:
+                f.write(offsets.astype(np.uint64).tobytes())
+
+    def vectors(self, count: int) -> np.ndarray:
+        """Memory-mapped view of the first count vectors, remapped as the index grows"""
+        if self._map is None or len(self._map) < count:
+            self._map = np.memmap(self.paths["vec"], dtype=np.float32, mode='r', shape=(count, self.dim))
+        return self._map[:count]
+
+    def texts(self, indices: List[int]) -> List[str]:
+        """Texts of the given entries (locked: a concurrent add() would extend the last one)"""
+        if not indices:
+            return []
+        with self.lock:
+            count = len(self)
+            offsets = np.memmap(self.paths["off"], dtype=np.uint64, mode='r', shape=(count,))
+            end_of_file = os.path.getsize(self.paths["txt"])
+            texts = []
+            with open(self.paths["txt"], 'rb') as f:
+                for index in indices:
+                    start = int(offsets[index])
+                    end = int(offsets[index + 1]) if index + 1 < count else end_of_file
+                    f.seek(start)
+                    texts.append(f.read(end - start).decode(errors="replace"))
+            return texts
+
+    def search(self, query: np.ndarray, k: int, exclude_recent: int = 0) -> List[Tuple[float, int]]:
+        """Top-k (score, index) pairs by cosine similarity, skipping the newest entries"""
+        with self.lock:
+            count = len(self) - exclude_recent
+            if count <= 0 or k <= 0:
+                return []
+            vectors = self.vectors(count)
+            best_scores = np.empty(0, dtype=np.float32)
+            best_indices = np.empty(0, dtype=np.int64)
+            for start in range(0, count, SEARCH_CHUNK):
+                scores = vectors[start:start + SEARCH_CHUNK] @ query
+                if len(scores) > k:
+                    top = np.argpartition(scores, -k)[-k:]
+                else:
+                    top = np.arange(len(scores))
+                best_scores = np.concatenate([best_scores, scores[top]])
+                best_indices = np.concatenate([best_indices, top + start])
+                if len(best_scores) > k:
+                    keep = np.argpartition(best_scores, -k)[-k:]
+                    best_scores, best_indices = best_scores[keep], best_indices[keep]
+            order = np.argsort(-best_scores)
+            return [(float(best_scores[i]), int(best_indices[i])) for i in order]
+
+    def delete(self):
+        with self.lock:
+            self._map = None
+            for path in self.paths.values():
+                if os.path.exists(path):
+                    os.remove(path)
+
+class LongTermMemory:
+    """Per-channel long-term memories under one directory"""
+
+    def __init__(self, directory: str, dim: int = DEFAULT_DIM):
+        self.directory = directory
+        self.embedder = HashingEmbedder(dim)
+        self.channels: Dict[str, ChannelMemory] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def channel(self, channel_id) -> ChannelMemory:
+        name = str(channel_id).replace("/", "_")
+        if name not in self.channels:
+            self.channels[name] = ChannelMemory(self.directory, name, self.embedder.dim)
+        return self.channels[name]
+
+    def add(self, channel_id, texts: List[str]):
+        """Store exchanges for a channel"""
+        if texts:
+            self.channel(channel_id).add(texts, self.embedder.embed(texts))
+
+    def recall(self, channel_id, query: str, k: int = 3, exclude_recent: int = 0, min_score: float = 0.0) -> List[str]:
+        """The k stored snippets most similar to the query, best first"""
+        query_vector = self.embedder.embed([query])[0]
+        if not query_vector.any():
+            return []
+        memory = self.channel(channel_id)
+        hits = [(score, index) for score, index in memory.search(query_vector, k, exclude_recent) if score >= min_score]
+        return memory.texts([index for _, index in hits])
+
+    def forget(self, channel_id):
+        self.channel(channel_id).delete()
+
+    def stats(self, channel_id) -> Dict[str, int]:
+        memory = self.channel(channel_id)
+        return {"entries": len(memory), "bytes": memory.size_on_disk()}
@@ -0,0 +1,136 @@
+"""
+Model catalog: which models each provider serves, with context length, pricing and
+typical throughput.
+
+Metadata starts from the bundled model_catalog.json and is refreshed from each
+provider's models endpoint (list_models() on the provider plugin). Refreshed
+lists are cached to disk with a TTL, so restarts don't refetch and lookups never
+touch the network. Once a provider's list is known, model IDs missing from it are
+reported as unavailable, which catches stale aliases at load time instead of as a
+failed request.
+
+Metadata fields (all optional):
+    context_length    prompt + completion tokens the model accepts
+    max_output        most completion tokens per request
+    prompt_price      USD per million prompt tokens
+    completion_price  USD per million completion tokens
+    throughput        typical output tokens per second
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+BUNDLED_CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_catalog.json")
+
+# Seconds a provider's fetched model list stays fresh
+DEFAULT_TTL = 24 * 3600.0
+
+class ModelCatalog:
+    """Bundled metadata plus live model lists per provider, cached on disk"""
+
+    def __init__(self, client, cache_path: Optional[str] = None, ttl: float = DEFAULT_TTL, bundled_path: str = BUNDLED_CATALOG):
+        self.client = client
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.bundled: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        if os.path.exists(bundled_path):
+            with open(bundled_path, 'r') as f:
+                self.bundled = json.load(f)
+        # provider -> {"fetched_at", "models": {model id: metadata}}
+        self.live: Dict[str, Dict[str, Any]] = {}
+        # Bumped whenever a fetched listing changes, so callers can cache what they derive from it
+        self.version = 0
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    self.live = json.load(f)
+            except (OSError, ValueError):
+                # A corrupt cache is just a cold cache
+                self.live = {}
+
+    def _resolve(self, model: str):
+        mapping = self.client.model_mappings.get(model)
+        if mapping is None:
+            return None, None
+        return mapping["provider"], mapping["model"]
+
+    def metadata(self, model: str) -> Dict[str, Any]:
+        """Everything known about a model alias (live values override bundled ones)"""
+        provider, model_id = self._resolve(model)
+        if provider is None:
+            return {}
+        live = self.live.get(provider, {}).get("models", {}).get(model_id, {})
+        return {**self.bundled.get(provider, {}).get(model_id, {}), **live}
+
+    def context_length(self, model: str) -> Optional[int]:
+        return self.metadata(model).get("context_length")
+
+    def throughput(self, model: str) -> Optional[float]:
+        return self.metadata(model).get("throughput")
+
+    def is_available(self, model: str) -> bool:
+        """False only if the provider's fetched model list lacks the model (unknown counts as available)"""
+        provider, model_id = self._resolve(model)
+        if provider is None:
+            return False
+        listing = self.live.get(provider)
+        return listing is None or model_id in listing["models"]
+
+    def problems(self, model: str, max_tokens: Optional[int] = None) -> List[str]:
+        """Reasons a character using this model would fail, if any"""
+        if model not in self.client.model_mappings:
+            return [f"unsupported model '{model}'"]
+        provider, model_id = self._resolve(model)
+        if not self.is_available(model):
+            return [f"{provider} no longer serves '{model_id}' (model '{model}')"]
+        max_output = self.metadata(model).get("max_output")
+        if max_tokens and max_output and max_tokens > max_output:
+            return [f"max_tokens {max_tokens} exceeds {max_output} for model '{model}'"]
+        return []
+
+    def stale_providers(self, providers: List[str]) -> List[str]:
+        now = time.time()
+        return [p for p in providers if now - self.live.get(p, {}).get("fetched_at", 0) > self.ttl]
+
+    def refresh(self, providers: Optional[List[str]] = None, force: bool = False) -> Dict[str, str]:
+        """Fetch model lists for providers whose cache expired; returns {provider: error} for failures.
+
+        Blocking (network): run it off the event loop.
+        """
+        if providers is None:
+            providers = self.client.configured_providers()
+        if not force:
+            providers = self.stale_providers(providers)
+        errors = {}
+        for provider in providers:
+            plugin = self.client.providers.get(provider)
+            if plugin is None:
+                continue
+            try:
+                models = plugin.list_models()
+            except NotImplementedError:
+                continue
+            except Exception as e:
+                # Keep the previous listing; an outage must not mark every model unavailable
+                errors[provider] = str(e)
+                continue
+            with self.lock:
+                if models != self.live.get(provider, {}).get("models"):
+                    self.version += 1
+                self.live[provider] = {"fetched_at": time.time(), "models": models}
+        if providers and self.cache_path:
+            self.save()
+        return errors
+
+    def save(self):
+        """Atomically write the fetched listings to the cache file"""
+        with self.lock:
+            data = json.dumps(self.live)
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.cache_path)
@@ -0,0 +1,185 @@
+"""
+Load shedding and graceful degradation for provider requests.
+
+Each request gets a degradation level from the current queue depth (requests in
+flight) and recently observed latency for its provider:
+
+    0 normal   - the character's model at its configured max_tokens
+    1 reduced  - same model, lower max_tokens
+    2 fallback - a cheaper/faster fallback model (also used while the provider is unhealthy,
+                 no longer lists the model or the model is unknown; if the fallback is
+                 unusable too, the fastest usable model in the catalog)
+    3 reject   - fail fast with a "busy" reply instead of queueing
+
+Thresholds come from the environment and can be overridden per character with an
+optional "overload" object in characters.json, e.g.
+    "overload": {"queue_depth": [4, 8, 16], "latency": [10, 20, 40],
+                 "reduced_max_tokens": 0.5, "fallback_model": "llama-3.1-8b-groq"}
+"""
+
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+LEVEL_NAMES = ["normal", "reduced", "fallback", "reject"]
+NORMAL, REDUCED, FALLBACK, REJECT = range(4)
+
+# Seconds of latency samples considered "recent"
+LATENCY_WINDOW = 60.0
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing a request when the bot is saturated"""
+
+
+def _thresholds(value: str) -> List[float]:
+    return [float(part) for part in value.split(',')]
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_overload(overload: Any):
+    """Check a character's "overload" object, raising ValueError on the first problem"""
+    if not isinstance(overload, dict):
+        raise ValueError("must be an object")
+    for field in ("queue_depth", "latency"):
+        if field in overload:
+            value = overload[field]
+            if not isinstance(value, list) or len(value) > REJECT or not all(_is_number(item) for item in value):
+                raise ValueError(f"'{field}' must be a list of up to {REJECT} numbers")
+    if "reduced_max_tokens" in overload:
+        value = overload["reduced_max_tokens"]
+        if not _is_number(value) or not 0 < value <= 1:
+            raise ValueError("'reduced_max_tokens' must be a number between 0 and 1")
+    if "fallback_model" in overload and not isinstance(overload["fallback_model"], (str, type(None))):
+        raise ValueError("'fallback_model' must be a model name")
+
+
+class LoadShedder:
+    """Tracks in-flight requests and latency, and decides how to serve each request"""
+
+    def __init__(self, client):
+        self.client = client
+        self.in_flight: Dict[int, Tuple[str, float]] = {}  # request id -> (provider, started)
+        self.samples: Dict[str, deque] = {}  # provider -> deque of (finished, latency)
+        self._next_id = 0
+        self.defaults = {
+            "queue_depth": _thresholds(os.getenv("OVERLOAD_QUEUE_DEPTH", "8,16,32")),
+            "latency": _thresholds(os.getenv("OVERLOAD_LATENCY", "15,30,60")),
+            "reduced_max_tokens": float(os.getenv("OVERLOAD_REDUCED_MAX_TOKENS", "0.5")),
+            "fallback_model": os.getenv("OVERLOAD_FALLBACK_MODEL", "gpt-4o-mini")
+        }
+
+    def settings(self, character: Dict[str, Any]) -> Dict[str, Any]:
+        """Defaults merged with the character's own overload settings"""
+        return {**self.defaults, **character.get("overload", {})}
+
+    def recent_latency(self, provider: str) -> float:
+        """Slowest recent latency for a provider, counting requests still in flight"""
+        now = time.monotonic()
+        samples = self.samples.get(provider, deque())
+        while samples and now - samples[0][0] > LATENCY_WINDOW:
+            samples.popleft()
+        latencies = [latency for _, latency in samples]
+        # A backed-up queue shows up here before any slow request completes
+        latencies += [now - started for p, started in self.in_flight.values() if p == provider]
+        if not latencies:
+            return 0.0
+        latencies.sort()
+        # 90th percentile keeps one outlier from degrading everyone
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))]
+
+    def level(self, character: Dict[str, Any]) -> int:
+        """Current degradation level for a character"""
+        settings = self.settings(character)
+        mapping = self.client.model_mappings.get(character["model"])
+        depth = len(self.in_flight)
+        latency = self.recent_latency(mapping["provider"]) if mapping else 0.0
+        level = NORMAL
+        for i, (max_depth, max_latency) in enumerate(zip(settings["queue_depth"], settings["latency"])):
+            if depth >= max_depth or latency >= max_latency:
+                level = i + 1
+        # An unknown model (e.g. removed from models.json) can only be served by a fallback
+        if level < FALLBACK and (not mapping or not self.client.is_healthy(mapping["provider"])):
+            level = FALLBACK
+        # A model the provider no longer lists would only fail after a round trip
+        catalog = getattr(self.client, "catalog", None)
+        if level < FALLBACK and catalog and not catalog.is_available(character["model"]):
+            level = FALLBACK
+        return level
+
+    def usable(self, model: Optional[str]) -> bool:
+        """Whether a model can take traffic right now: known, configured, healthy and still served"""
+        if model not in self.client.model_mappings:
+            return False
+        provider = self.client.model_mappings[model]["provider"]
+        # No API key means every request to it fails, however healthy it looks
+        if provider not in self.client.configured_providers():
+            return False
+        catalog = getattr(self.client, "catalog", None)
+        if catalog and not catalog.is_available(model):
+            return False
+        return self.client.is_healthy(provider)
+
+    def fastest_usable_model(self) -> Optional[str]:
+        """Configured model with the highest catalog throughput, for when no fallback is usable"""
+        catalog = getattr(self.client, "catalog", None)
+        if not catalog:
+            return None
+        candidates = [
+            (catalog.throughput(model), model) for model in self.client.model_mappings
+            if catalog.throughput(model) and self.usable(model)
+        ]
+        return max(candidates)[1] if candidates else None
+
+    def plan(self, character: Dict[str, Any]) -> Tuple[int, str, int]:
+        """Decide (level, model, max_tokens) for a request, raising Overloaded at the reject level"""
+        settings = self.settings(character)
+        level = self.level(character)
+        model = character["model"]
+        max_tokens = character["max_tokens"]
+        if level >= REJECT:
+            raise Overloaded("⏳ I'm swamped right now — please try again in a moment.")
+        if level >= REDUCED:
+            max_tokens = max(1, int(max_tokens * settings["reduced_max_tokens"]))
+        if level >= FALLBACK:
+            fallback = settings.get("fallback_model")
+            if self.usable(fallback):
+                model = fallback
+            else:
+                model = self.fastest_usable_model() or model
+        if model not in self.client.model_mappings:
+            raise ValueError(f"Model '{model}' is not supported and no fallback model is usable")
+        return level, model, max_tokens
+
+    @contextmanager
+    def track(self, model: str):
+        """Count a request as in flight and record its latency when it finishes"""
+        provider = self.client.model_mappings[model]["provider"]
+        request_id = self._next_id
+        self._next_id += 1
+        started = time.monotonic()
+        self.in_flight[request_id] = (provider, started)
+        try:
+            yield
+        finally:
+            del self.in_flight[request_id]
+            finished = time.monotonic()
+            self.samples.setdefault(provider, deque()).append((finished, finished - started))
+
+    def status(self, characters: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Snapshot of load for display: queue depth, latency per provider, level per character"""
+        providers = set(self.samples) | {p for p, _ in self.in_flight.values()}
+        status = {
+            "in_flight": len(self.in_flight),
+            "latency": {provider: self.recent_latency(provider) for provider in sorted(providers)},
+            "levels": {}
+        }
+        for char_id, character in (characters or {}).items():
+            if character["model"] in self.client.model_mappings:
+                status["levels"][char_id] = LEVEL_NAMES[self.level(character)]
+        return status
@@ -0,0 +1,391 @@
+"""
+Provider plugins for UniversalAIClient.
+
+A provider knows how to run chat completions against one API. Most providers speak
+the OpenAI chat completions protocol, so a single OpenAICompatibleProvider covers
+OpenRouter, Groq and local inference servers (llama.cpp, vLLM, Ollama) by base URL.
+OpenAI and Anthropic use their own SDKs, which also give access to batch APIs.
+
+To add a provider, subclass Provider (or configure an OpenAICompatibleProvider in
+models.json) and register it with UniversalAIClient.register_provider().
+"""
+
+import os
+import json
+from typing import Dict, List, Any, Optional, Iterator, Generator
+from import_timing import lazy_import
+
+# Provider stop reasons normalized to the OpenAI vocabulary ("stop", "length", ...)
+FINISH_REASONS = {
+    "end_turn": "stop",
+    "stop_sequence": "stop",
+    "max_tokens": "length"
+}
+
+def normalize_finish_reason(reason: Optional[str]) -> Optional[str]:
+    return FINISH_REASONS.get(reason, reason)
+
+class AIResponse:
+    """Standardized response format across all providers"""
+    def __init__(self, content: str, model: str, provider: str, tokens_used: Optional[int] = None, finish_reason: Optional[str] = None,
+                 completion_tokens: Optional[int] = None):
+        self.content = content
+        self.model = model
+        self.provider = provider
+        self.tokens_used = tokens_used
+        self.finish_reason = normalize_finish_reason(finish_reason)
+        self.completion_tokens = completion_tokens  # tokens in the reply alone, when reported
+
+    @property
+    def truncated(self) -> bool:
+        """Whether the reply was cut off by max_tokens"""
+        return self.finish_reason == "length"
+
+class Provider:
+    """Base class for provider plugins"""
+
+    # Which batch API the provider supports ("openai", "anthropic"), if any
+    batch_api: Optional[str] = None
+
+    def __init__(self, name: str, api_key_env: Optional[str] = None):
+        self.name = name
+        self.api_key_env = api_key_env
+
+    def api_key(self) -> Optional[str]:
+        return os.getenv(self.api_key_env) if self.api_key_env else None
+
+    def require_api_key(self) -> Optional[str]:
+        """The API key, raising if the provider needs one and none is configured"""
+        api_key = self.api_key()
+        if self.api_key_env and not api_key:
+            raise Exception(f"{self.name} API key not configured")
+        return api_key
+
+    def is_configured(self) -> bool:
+        """Whether the provider can be used (providers without a key env are always usable)"""
+        return not self.api_key_env or bool(self.api_key())
+
+    def complete(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> AIResponse:
+        raise NotImplementedError
+
+    def stream(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> Generator[str, None, AIResponse]:
+        """Yield text deltas, returning the full AIResponse when exhausted"""
+        raise NotImplementedError
+
+    def probe(self):
+        """Tiny, free request that validates the key and opens a pooled connection"""
+        raise NotImplementedError
+
+    def list_models(self) -> Dict[str, Dict[str, Any]]:
+        """Models the provider currently serves: {model id: metadata} (see model_catalog.py)"""
+        raise NotImplementedError
+
+class OpenAIProvider(Provider):
+    """OpenAI via the official SDK"""
+
+    batch_api = "openai"
+
+    def __init__(self, name: str = "openai", api_key_env: str = "OPENAI_API_KEY"):
+        super().__init__(name, api_key_env)
+        self._client = None
+
+    def client(self):
+        """Initialize OpenAI client if not already done"""
+        if not self._client:
+            self._client = lazy_import("openai").OpenAI(api_key=self.require_api_key())
+        return self._client
+
+    def complete(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> AIResponse:
+        response = self.client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+
+        content = response.choices[0].message.content
+        tokens_used = response.usage.total_tokens if response.usage else None
+        completion_tokens = response.usage.completion_tokens if response.usage else None
+
+        return AIResponse(content, model, self.name, tokens_used, response.choices[0].finish_reason, completion_tokens)
+
+    def stream(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> Generator[str, None, AIResponse]:
+        parts = []
+        tokens_used = None
+        completion_tokens = None
+        finish_reason = None
+        stream = self.client().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    tokens_used = chunk.usage.total_tokens
+                    completion_tokens = chunk.usage.completion_tokens
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    finish_reason = chunk.choices[0].finish_reason
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+        return AIResponse("".join(parts), model, self.name, tokens_used, finish_reason, completion_tokens)
+
+    def probe(self):
+        self.client().models.list()
+
+    def list_models(self) -> Dict[str, Dict[str, Any]]:
+        # OpenAI only lists IDs; context and pricing come from the bundled catalog
+        return {model.id: {} for model in self.client().models.list()}
+
+class AnthropicProvider(Provider):
+    """Anthropic Claude via the official SDK"""
+
+    batch_api = "anthropic"
+
+    def __init__(self, name: str = "anthropic", api_key_env: str = "ANTHROPIC_API_KEY"):
+        super().__init__(name, api_key_env)
+        self._client = None
+
+    def client(self):
+        """Initialize Anthropic client if not already done"""
+        if not self._client:
+            self._client = lazy_import("anthropic").Anthropic(api_key=self.require_api_key())
+        return self._client
+
+    @staticmethod
+    def convert_messages(messages: List[Dict]):
+        """Convert OpenAI format to Anthropic format: (system prompt, remaining messages)"""
+        system_message = ""
+        user_messages = []
+
+        for msg in messages:
+            if msg["role"] == "system":
+                system_message = msg["content"]
+            else:
+                user_messages.append(msg)
+
+        return system_message, user_messages
+
+    def complete(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> AIResponse:
+        system_message, user_messages = self.convert_messages(messages)
+
+        response = self.client().messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system_message,
+            messages=user_messages
+        )
+
+        content = response.content[0].text
+        tokens_used = response.usage.input_tokens + response.usage.output_tokens
+
+        return AIResponse(content, model, self.name, tokens_used, response.stop_reason, response.usage.output_tokens)
+
+    def stream(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> Generator[str, None, AIResponse]:
+        parts = []
+        system_message, user_messages = self.convert_messages(messages)
+        with self.client().messages.stream(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            system=system_message,
+            messages=user_messages
+        ) as stream:
+            for text in stream.text_stream:
+                parts.append(text)
+                yield text
+            final = stream.get_final_message()
+        usage = final.usage
+        return AIResponse("".join(parts), model, self.name, usage.input_tokens + usage.output_tokens, final.stop_reason, usage.output_tokens)
+
+    def probe(self):
+        self.client().models.list(limit=1)
+
+    def list_models(self) -> Dict[str, Dict[str, Any]]:
+        models = {}
+        for model in self.client().models.list(limit=1000):
+            metadata = {}
+            if getattr(model, "max_input_tokens", None):
+                metadata["context_length"] = model.max_input_tokens
+            if getattr(model, "max_tokens", None):
+                metadata["max_output"] = model.max_tokens
+            models[model.id] = metadata
+        return models
+
+class OpenAICompatibleProvider(Provider):
+    """Any server speaking the OpenAI chat completions protocol, configured by base URL.
+
+    Covers hosted APIs (OpenRouter, Groq) as well as local inference servers such as
+    llama.cpp's server or vLLM, which need no API key (leave api_key_env unset).
+    base_url_env, if given, overrides base_url from the environment; a keyless
+    provider with base_url_env only counts as configured when that variable is set.
+    """
+
+    def __init__(self,
+                 name: str,
+                 base_url: str,
+                 api_key_env: Optional[str] = None,
+                 base_url_env: Optional[str] = None,
+                 headers: Optional[Dict[str, str]] = None,
+                 probe_path: str = "/models",
+                 timeout: Optional[float] = None):
+        super().__init__(name, api_key_env)
+        self.default_base_url = base_url
+        self.base_url_env = base_url_env
+        self.headers = headers or {}
+        self.probe_path = probe_path
+        self.timeout = timeout
+        self._session = None
+
+    @property
+    def base_url(self) -> str:
+        # Resolved per request, since .env is only loaded on first use
+        if self.base_url_env and os.getenv(self.base_url_env):
+            return os.getenv(self.base_url_env).rstrip("/")
+        return self.default_base_url.rstrip("/")
+
+    def is_configured(self) -> bool:
+        if not self.api_key_env and self.base_url_env:
+            return bool(os.getenv(self.base_url_env))
+        return super().is_configured()
+
+    def session(self):
+        """Pooled keep-alive HTTP session"""
+        if self._session is None:
+            self._session = lazy_import("requests").Session()
+        return self._session
+
+    def request_headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json", **self.headers}
+        api_key = self.require_api_key()
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        return headers
+
+    def complete(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> AIResponse:
+        data = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+
+        response = self.session().post(
+            f"{self.base_url}/chat/completions",
+            headers=self.request_headers(),
+            data=json.dumps(data),
+            timeout=self.timeout
+        )
+
+        if response.status_code != 200:
+            raise Exception(f"{self.name} API error: {response.status_code} - {response.text}")
+
+        result = response.json()
+        content = result["choices"][0]["message"]["content"]
+        usage = result.get("usage") or {}
+
+        return AIResponse(content, model, self.name, usage.get("total_tokens"), result["choices"][0].get("finish_reason"),
+                          usage.get("completion_tokens"))
+
+    def stream(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> Generator[str, None, AIResponse]:
+        parts = []
+        tokens_used = None
+        completion_tokens = None
+        finish_reason = None
+        data = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+
+        response = self.session().post(
+            f"{self.base_url}/chat/completions",
+            headers=self.request_headers(),
+            data=json.dumps(data),
+            stream=True,
+            timeout=self.timeout
+        )
+        try:
+            if response.status_code != 200:
+                raise Exception(f"{self.name} API error: {response.status_code} - {response.text}")
+            for chunk in self._events(response):
+                # OpenRouter reports usage on the last chunk, Groq under x_groq
+                usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage")
+                if usage:
+                    tokens_used = usage.get("total_tokens")
+                    completion_tokens = usage.get("completion_tokens")
+                choices = chunk.get("choices") or [{}]
+                if choices[0].get("finish_reason"):
+                    finish_reason = choices[0]["finish_reason"]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            response.close()
+        return AIResponse("".join(parts), model, self.name, tokens_used, finish_reason, completion_tokens)
+
+    @staticmethod
+    def _events(response) -> Iterator[Dict[str, Any]]:
+        """Parse server-sent events from a streaming response"""
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            payload = line[len("data: "):]
+            if payload == "[DONE]":
+                break
+            yield json.loads(payload)
+
+    def probe(self):
+        headers = {key: value for key, value in self.request_headers().items() if key != "Content-Type"}
+        response = self.session().get(f"{self.base_url}{self.probe_path}", headers=headers, timeout=10)
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code}")
+
+    def list_models(self) -> Dict[str, Dict[str, Any]]:
+        headers = {key: value for key, value in self.request_headers().items() if key != "Content-Type"}
+        response = self.session().get(f"{self.base_url}/models", headers=headers, timeout=30)
+        if response.status_code != 200:
+            raise Exception(f"{self.name} API error: {response.status_code} - {response.text}")
+        models = {}
+        for entry in response.json().get("data", []):
+            metadata = {}
+            # OpenRouter: context_length, Groq: context_window, vLLM: max_model_len
+            for field in ("context_length", "context_window", "max_model_len"):
+                if entry.get(field):
+                    metadata["context_length"] = int(entry[field])
+                    break
+            max_output = entry.get("max_completion_tokens") or (entry.get("top_provider") or {}).get("max_completion_tokens")
+            if max_output:
+                metadata["max_output"] = int(max_output)
+            # OpenRouter prices are USD per token; the catalog uses USD per million tokens
+            pricing = entry.get("pricing") or {}
+            if pricing.get("prompt") is not None and pricing.get("completion") is not None:
+                metadata["prompt_price"] = float(pricing["prompt"]) * 1e6
+                metadata["completion_price"] = float(pricing["completion"]) * 1e6
+            models[entry["id"]] = metadata
+        return models
+
+# Provider types that can be configured from models.json
+PROVIDER_TYPES = {
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider,
+    "openai_compatible": OpenAICompatibleProvider
+}
+
+def provider_from_config(name: str, config: Dict[str, Any]) -> Provider:
+    """Build a provider from a "providers" entry in models.json"""
+    config = dict(config)
+    provider_type = config.pop("type", "openai_compatible")
+    if provider_type not in PROVIDER_TYPES:
+        raise ValueError(f"Provider '{name}' has unknown type '{provider_type}'")
+    return PROVIDER_TYPES[provider_type](name=name, **config)
@@ -0,0 +1,145 @@
+"""
+Replay a recorded traffic log (see traffic.py) against the Discord bot, offline.
+
+Recorded messages, edits and deletes are fed to the bot's event handlers with their
+original spacing, and every provider call is answered from the recorded responses
+with the recorded latency. Nothing connects to Discord or to any provider, so
+throughput and latency regressions can be measured deterministically.
+
+Commands (messages starting with "!") are counted but not replayed. Use the same
+characters.json as the recording for requests to line up.
+
+Usage:
+    TRAFFIC_RECORD=traffic.jsonl.gz python discord_bot.py      # record
+    python replay_traffic.py traffic.jsonl.gz [--speed 1|10|max]  # replay
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+# Replays must not record themselves or touch a shared state database
+os.environ.pop("TRAFFIC_RECORD", None)
+os.environ.pop("BOT_STATE_DB", None)
+os.environ["WARMUP_ON_READY"] = "0"
+
+from traffic import ReplayProvider, read_traffic
+
+class ReplayUser:
+    def __init__(self, user_id, name):
+        self.id = user_id
+        self.display_name = name
+        self.name = name
+
+class ReplayChannel:
+    """Stands in for a Discord text channel, recording what the bot sends"""
+
+    def __init__(self, channel_id, name):
+        self.id = channel_id
+        self.name = name
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((time.monotonic(), content))
+
+    @asynccontextmanager
+    async def typing(self):
+        yield
+
+class ReplayMessage:
+    def __init__(self, message_id, channel, author, content):
+        self.id = message_id
+        self.channel = channel
+        self.author = author
+        self.content = content
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+async def replay(path, speed):
+    import discord_bot
+
+    records = list(read_traffic(path))
+    header = next((r for r in records if r["type"] == "header"), {})
+    completions = [r for r in records if r["type"] == "completion"]
+    events = [r for r in records if r["type"] in ("message", "edit", "delete")]
+
+    # Route every model to the recorded responses
+    provider = ReplayProvider(completions, redacted=header.get("redacted", False), speed=speed)
+    discord_bot.ai_client.register_provider(provider)
+    for name in discord_bot.ai_client.model_mappings:
+        discord_bot.ai_client.model_mappings[name] = {"provider": provider.name, "model": name}
+
+    channels = {}
+    messages = {}
+    handler_latency = []
+    skipped = 0
+    tasks = []
+
+    async def dispatch(handler, *args):
+        start = time.monotonic()
+        await handler(*args)
+        handler_latency.append(time.monotonic() - start)
+
+    started = time.monotonic()
+    for event in events:
+        if speed:
+            delay = started + event["t"] / speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        if event["type"] == "message":
+            name = discord_bot.AI_CHANNEL_NAME if event["ai_channel"] else "other"
+            channel = channels.setdefault(event["channel"], ReplayChannel(event["channel"], name))
+            if event["ai_channel"]:
+                discord_bot.ai_channel_ids.add(channel.id)
+            message = ReplayMessage(event["message"], channel, ReplayUser(event["author"], event["name"]), event["content"])
+            messages[event["message"]] = message
+            if message.content.startswith('!'):
+                skipped += 1
+                continue
+            tasks.append(asyncio.create_task(dispatch(discord_bot.on_message, message)))
+        elif event["message"] in messages:
+            before = messages[event["message"]]
+            if event["type"] == "delete":
+                tasks.append(asyncio.create_task(dispatch(discord_bot.on_message_delete, before)))
+            else:
+                after = ReplayMessage(before.id, before.channel, before.author, event["content"])
+                messages[after.id] = after
+                tasks.append(asyncio.create_task(dispatch(discord_bot.on_message_edit, before, after)))
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Aggregated turns are answered after their debounce window
+    while discord_bot.pending_turns or discord_bot.answering_turns or discord_bot.generations:
+        await asyncio.sleep(0.05)
+    elapsed = time.monotonic() - started
+
+    replies = sum(len(channel.sent) for channel in channels.values())
+    print(f"Replayed {len(tasks)} events ({skipped} commands skipped) in {elapsed:.2f}s at "
+          f"{'max' if not speed else f'{speed:g}x'} speed")
+    print(f"Replies sent: {replies} ({replies / elapsed if elapsed else 0:.1f}/s)")
+    print(f"Provider calls: {provider.served} ({provider.unmatched} without a recorded response)")
+    print(f"Handler latency: p50 {percentile(handler_latency, 0.5) * 1000:.0f}ms, "
+          f"p90 {percentile(handler_latency, 0.9) * 1000:.0f}ms, "
+          f"p99 {percentile(handler_latency, 0.99) * 1000:.0f}ms, "
+          f"max {max(handler_latency, default=0) * 1000:.0f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Discord traffic against the bot without calling providers")
+    parser.add_argument("path", help="Traffic log written with TRAFFIC_RECORD")
+    parser.add_argument("--speed", default="1", help="Replay speed multiplier, or 'max' for no delays")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed must be positive or 'max'")
+    asyncio.run(replay(args.path, speed))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Adaptive max_tokens from observed reply lengths.
+
+Some providers reserve capacity or schedule by the requested max_tokens, so asking
+for 1000 tokens when replies run to 200 costs queueing time for nothing. For each
+(character, model) pair the recent reply lengths are kept, and once there are
+enough of them requests ask for a high percentile of that distribution plus
+headroom instead. The character's configured max_tokens stays the hard cap.
+
+A truncated reply only says the reply wanted at least what it got, so it is counted
+as needing the full configured budget (even when load shedding had lowered the cap):
+if replies start getting cut off, the percentile climbs back to the cap by itself.
+
+Environment:
+    ADAPTIVE_MAX_TOKENS             0 disables (default 1)
+    ADAPTIVE_MAX_TOKENS_PERCENTILE  reply length percentile to cover (default 0.95)
+    ADAPTIVE_MAX_TOKENS_HEADROOM    multiplier on that percentile (default 1.25)
+    ADAPTIVE_MAX_TOKENS_MIN_SAMPLES replies observed before adapting (default 20)
+"""
+
+import os
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+# Replies remembered per (character, model)
+WINDOW = 200
+
+# Never ask for less than this, however short replies have been
+MIN_MAX_TOKENS = 64
+
+
+def estimate_completion_tokens(content: str) -> int:
+    """Rough reply length for providers that don't report usage (about 4 characters per token)"""
+    return max(1, len(content) // 4)
+
+
+class ReplyBudget:
+    """Learns reply lengths per (character, model) and picks max_tokens from them"""
+
+    def __init__(self):
+        self.enabled = os.getenv("ADAPTIVE_MAX_TOKENS", "1") == "1"
+        self.percentile = float(os.getenv("ADAPTIVE_MAX_TOKENS_PERCENTILE", "0.95"))
+        self.headroom = float(os.getenv("ADAPTIVE_MAX_TOKENS_HEADROOM", "1.25"))
+        self.min_samples = int(os.getenv("ADAPTIVE_MAX_TOKENS_MIN_SAMPLES", "20"))
+        self.samples: Dict[Tuple[str, str], deque] = {}  # (character ID, model) -> reply lengths
+        # (character, model) -> {"requests", "adapted", "saved", "unused", "truncated"}
+        self.totals: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    def learned(self, character: str, model: str) -> Optional[int]:
+        """max_tokens covering the configured percentile of recent replies, or None without enough data"""
+        samples = self.samples.get((character, model))
+        if not samples or len(samples) < self.min_samples:
+            return None
+        lengths = sorted(samples)
+        length = lengths[min(len(lengths) - 1, int(len(lengths) * self.percentile))]
+        return max(MIN_MAX_TOKENS, int(length * self.headroom))
+
+    def max_tokens(self, character: str, model: str, cap: int) -> int:
+        """max_tokens to request: the learned budget, never above cap"""
+        learned = self.learned(character, model) if self.enabled else None
+        return cap if learned is None else min(cap, learned)
+
+    def observe(self, character: str, model: str, response, requested: int, cap: int, configured: Optional[int] = None):
+        """Record a finished reply that was requested with max_tokens=requested.
+
+        cap is the most that could have been requested (lowered under load), configured
+        the character's own max_tokens (cap if not given).
+        """
+        used = response.completion_tokens
+        if used is None:
+            used = estimate_completion_tokens(response.content or "")
+        # A cut-off reply wanted at least as much as it got: count it as needing the configured
+        # budget, not a cap lowered by load shedding
+        length = max(configured or cap, used) if response.truncated else used
+        self.samples.setdefault((character, model), deque(maxlen=WINDOW)).append(length)
+
+        totals = self.totals.setdefault((character, model), {"requests": 0, "adapted": 0, "saved": 0, "unused": 0, "truncated": 0})
+        totals["requests"] += 1
+        totals["unused"] += max(0, requested - used)
+        if requested < cap:
+            totals["adapted"] += 1
+            totals["saved"] += cap - requested
+            if response.truncated:
+                totals["truncated"] += 1
+
+    def state(self) -> list:
+        """Learned reply lengths as JSON-serializable rows, for checkpointing"""
+        return [[character, model, list(lengths)] for (character, model), lengths in self.samples.items()]
+
+    def restore(self, rows: list):
+        for character, model, lengths in rows:
+            self.samples[(character, model)] = deque(lengths, maxlen=WINDOW)
+
+    def report(self, caps: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """Per (character ID, model) budgets and totals for display; caps maps character ID to configured max_tokens"""
+        rows = []
+        for (character, model), totals in sorted(self.totals.items()):
+            rows.append({
+                "character": character,
+                "model": model,
+                "samples": len(self.samples.get((character, model), ())),
+                "learned": self.learned(character, model),
+                "cap": (caps or {}).get(character),
+                **totals
+            })
+        return {
+            "enabled": self.enabled,
+            "rows": rows,
+            "saved": sum(row["saved"] for row in rows),
+            "unused": sum(row["unused"] for row in rows),
+            "requests": sum(row["requests"] for row in rows)
+        }
@@ -0,0 +1,160 @@
+"""
+Shared local state store for running the Discord bot as several shard processes.
+
+Every process opens the same SQLite database (in WAL mode, so readers never block
+the single writer) and sees the same conversation and character state. Values are
+stored as JSON and keyed by namespace, e.g. "conversations" or "active_characters".
+
+The event loop never waits on the database: each namespace is read into memory when
+it is opened, and writes are queued for a writer thread that commits them in batches.
+That is safe because channel state has one writer, the shard process whose guild the
+channel is in.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from structured_logging import get_logger
+
+log = get_logger(__name__)
+
+# Seconds a write waits for another process's transaction before giving up and retrying
+BUSY_TIMEOUT = 1.0
+
+# Seconds between retries of a batch the database refused
+RETRY_INTERVAL = 0.5
+
+
+class SQLiteStore:
+    """SQLite database shared by all bot processes on this machine"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # Autocommit mode: the writer thread opens its own transaction per batch
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        self.pending: Dict[Tuple[str, str], Optional[str]] = {}  # (namespace, key) -> JSON value, None deletes
+        self.writing = False
+        self.closed = False
+        self.changed = threading.Condition()
+        self.writer = threading.Thread(target=self.write_behind, name="state-writer", daemon=True)
+        self.writer.start()
+
+    def table(self, namespace: str) -> "PersistentDict":
+        """Get a dict-like view of one namespace"""
+        return PersistentDict(self, namespace)
+
+    def execute(self, sql: str, params: tuple = ()) -> list:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def write(self, namespace: str, key: str, value: Optional[str]):
+        """Queue a write of a JSON value (None deletes); a later write to the same key replaces it"""
+        with self.changed:
+            self.pending[(namespace, key)] = value
+            self.changed.notify_all()
+
+    def commit(self, batch: Dict[Tuple[str, str], Optional[str]]):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for (namespace, key), value in batch.items():
+                    if value is None:
+                        self.conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+                    else:
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+                            (namespace, key, value)
+                        )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def write_behind(self):
+        """Writer thread: commit queued writes until closed and drained"""
+        while True:
+            with self.changed:
+                while not self.pending and not self.closed:
+                    self.changed.wait()
+                if not self.pending:
+                    return
+                batch, self.pending = self.pending, {}
+                self.writing = True
+            try:
+                self.commit(batch)
+            except sqlite3.Error as e:
+                log.error("state_write_failed", writes=len(batch), error=str(e))
+                with self.changed:
+                    # Writes queued meanwhile are newer than the failed batch
+                    self.pending = {**batch, **self.pending}
+                    if self.closed:
+                        return
+                time.sleep(RETRY_INTERVAL)
+            finally:
+                with self.changed:
+                    self.writing = False
+                    self.changed.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued writes are committed; returns False on timeout"""
+        with self.changed:
+            return self.changed.wait_for(lambda: not self.pending and not self.writing, timeout)
+
+    def close(self, timeout: float = 10):
+        """Commit queued writes (for up to timeout seconds) and close the database"""
+        with self.changed:
+            if self.closed:
+                return
+            self.closed = True
+            self.changed.notify_all()
+        self.writer.join(timeout)
+        with self.lock:
+            self.conn.close()
+
+
+class PersistentDict(MutableMapping):
+    """Dict-like namespace in a SQLiteStore.
+
+    The namespace is loaded when the view is created; reads are then answered from
+    memory and writes go through the store's writer thread. Values are decoded copies:
+    mutating one in place does nothing until it is assigned back.
+    """
+
+    def __init__(self, store: SQLiteStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+        rows = store.execute("SELECT key, value FROM state WHERE namespace = ?", (namespace,))
+        self.rows: Dict[Any, str] = {json.loads(key): value for key, value in rows}  # key -> JSON value
+
+    def __getitem__(self, key: Any) -> Any:
+        return json.loads(self.rows[key])
+
+    def __setitem__(self, key: Any, value: Any):
+        encoded = json.dumps(value)
+        self.rows[key] = encoded
+        self.store.write(self.namespace, json.dumps(key), encoded)
+
+    def __delitem__(self, key: Any):
+        del self.rows[key]
+        self.store.write(self.namespace, json.dumps(key), None)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.rows
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(list(self.rows))
+
+    def __len__(self) -> int:
+        return len(self.rows)
@@ -0,0 +1,151 @@
+"""
+Queue-backed structured logging (JSON lines) for the bot.
+
+Log calls only build a record and put it on an in-memory queue; a QueueListener
+thread formats and writes it, so the event loop never blocks on stdout or disk.
+
+    log = get_logger(__name__)
+    with log_context(channel=channel_id, character="pirate"):
+        log.info("completion", model="gpt-4o", latency_ms=812, tokens=230)
+
+emits (fields from log_context are attached to every record logged inside it,
+including from tasks and threads started there):
+
+    {"ts": "...", "level": "info", "logger": "discord_bot", "event": "completion",
+     "channel": 123, "character": "pirate", "model": "gpt-4o", "latency_ms": 812, "tokens": 230}
+
+Environment:
+    LOG_LEVEL   debug, info (default), warning, error
+    LOG_FORMAT  json (default) or text
+    LOG_FILE    append to a file instead of stdout
+    LOG_SAMPLE  keep only a fraction of high-frequency events, e.g. "completion=0.1,reply=0.5"
+                (warnings and errors are never sampled out)
+"""
+
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default={})
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields to every record logged inside the block (and tasks/threads it starts)"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger taking an event name plus keyword fields: log.info("event", key=value)"""
+
+    RESERVED = ("exc_info", "stack_info", "stacklevel", "extra")
+
+    def __init__(self, logger: logging.Logger):
+        super().__init__(logger, {})
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in self.RESERVED}
+        kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name))
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that captures the log context and defers all formatting to the listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # In-process queue: no pickling, so keep exc_info and only pin down the message
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.context = _context.get()
+        return record
+
+class SamplingFilter(logging.Filter):
+    """Drop a fraction of records for configured events (below WARNING only)"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.msg)
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        return random.random() < rate
+
+def record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    return {**getattr(record, "context", {}), **getattr(record, "fields", {})}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage()
+        }
+        entry.update(record_fields(record))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for part in value.split(','):
+        if '=' in part:
+            event, rate = part.split('=', 1)
+            rates[event.strip()] = float(rate)
+    return rates
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None, path: Optional[str] = None, sample: Optional[str] = None):
+    """Route all logging through a queue to a background writer thread (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    level = (level or os.getenv("LOG_LEVEL", "info")).upper()
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+    path = path or os.getenv("LOG_FILE")
+    sample = sample if sample is not None else os.getenv("LOG_SAMPLE", "")
+
+    output = logging.FileHandler(path) if path else logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    handler = ContextQueueHandler(queue.SimpleQueue())
+    handler.addFilter(SamplingFilter(parse_sample_rates(sample)))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    # Flush whatever is still queued on exit
+    atexit.register(_listener.stop)
+    return _listener
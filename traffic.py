@@ -0,0 +1,206 @@
+"""
+Traffic recording and replay for offline performance testing.
+
+TrafficRecorder writes a compact, gzipped JSON-lines log of anonymised Discord
+events and UniversalAIClient request/response pairs with their timings. Discord
+and user IDs are replaced by salted hashes and display names by pseudonyms; with
+redact=True message and response text is replaced by placeholders of the same
+length, keeping the traffic shape without the content.
+
+ReplayProvider is a provider plugin that serves the recorded responses with their
+recorded timings (scaled by a speed factor), so replay_traffic.py can drive the
+bot without calling any provider.
+
+Record types (one JSON object per line, "t" = seconds since recording started):
+    {"t", "type": "message", "channel", "message", "author", "name", "content", "ai_channel"}
+    {"t", "type": "edit",    "channel", "message", "content"}
+    {"t", "type": "delete",  "channel", "message"}
+    {"t", "type": "completion", "model", "key", "prompt_chars", "max_tokens",
+     "latency", "first_token", "content", "tokens_used", "completion_tokens", "finish_reason"} (or "error")
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, Generator, Iterator, List, Optional
+
+from providers import AIResponse, Provider
+
+# Seconds between flushes of the compressed log
+FLUSH_INTERVAL = 1.0
+
+def redact(text: str) -> str:
+    """Placeholder of the same length (idempotent, so replayed histories redact identically)"""
+    return "x" * len(text)
+
+def request_key(model: str, messages: List[Dict[str, str]], redacted: bool) -> str:
+    """Short digest identifying a request, used to match replayed requests to recorded ones"""
+    contents = [[m["role"], redact(m["content"]) if redacted else m["content"]] for m in messages]
+    return hashlib.sha256(json.dumps([model, contents]).encode()).hexdigest()[:16]
+
+def read_traffic(path: str) -> Iterator[Dict[str, Any]]:
+    """Read the records of a traffic log"""
+    with gzip.open(path, 'rt') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+class TrafficRecorder:
+    """Append-only recorder for Discord events and provider calls"""
+
+    def __init__(self, path: str, redact_content: bool = False, salt: Optional[str] = None):
+        self.path = path
+        self.redact_content = redact_content
+        # A fresh random salt per recording unless given, so IDs can't be reversed by lookup
+        self.salt = (salt or os.urandom(16).hex()).encode()
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'at')
+        self._last_flush = self.started
+        self._write({"type": "header", "redacted": redact_content, "version": 1})
+
+    def anonymise(self, value: Any) -> int:
+        """Stable pseudonymous integer for a Discord ID"""
+        digest = hashlib.sha256(self.salt + str(value).encode()).hexdigest()
+        return int(digest[:12], 16)
+
+    def text(self, content: str) -> str:
+        return redact(content) if self.redact_content else content
+
+    def _write(self, record: Dict[str, Any]):
+        record["t"] = round(time.monotonic() - self.started, 4)
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line)
+            if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = time.monotonic()
+
+    def message(self, message, ai_channel: bool):
+        author = self.anonymise(message.author.id)
+        self._write({
+            "type": "message",
+            "channel": self.anonymise(message.channel.id),
+            "message": self.anonymise(message.id),
+            "author": author,
+            "name": f"user{author % 10000}",
+            "content": self.text(message.content),
+            "ai_channel": ai_channel
+        })
+
+    def edit(self, message):
+        self._write({
+            "type": "edit",
+            "channel": self.anonymise(message.channel.id),
+            "message": self.anonymise(message.id),
+            "content": self.text(message.content)
+        })
+
+    def delete(self, message):
+        self._write({
+            "type": "delete",
+            "channel": self.anonymise(message.channel.id),
+            "message": self.anonymise(message.id)
+        })
+
+    def completion(self,
+                   model: str,
+                   messages: List[Dict[str, str]],
+                   max_tokens: int,
+                   latency: float,
+                   first_token: Optional[float] = None,
+                   response: Optional[AIResponse] = None,
+                   error: Optional[str] = None):
+        record = {
+            "type": "completion",
+            "model": model,
+            "key": request_key(model, messages, self.redact_content),
+            "prompt_chars": sum(len(m["content"]) for m in messages),
+            "max_tokens": max_tokens,
+            "latency": round(latency, 4),
+            "first_token": round(first_token, 4) if first_token is not None else None
+        }
+        if response is not None:
+            record["content"] = self.text(response.content)
+            record["tokens_used"] = response.tokens_used
+            record["completion_tokens"] = response.completion_tokens
+            record["finish_reason"] = response.finish_reason
+        else:
+            record["error"] = error
+        self._write(record)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class ReplayProvider(Provider):
+    """Serves recorded completions instead of calling a provider.
+
+    Requests are matched to recordings by request key, falling back to the next
+    unused recording for the same model (histories drift once timing differs).
+    speed scales recorded latencies; None replays with no delay at all.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], redacted: bool, speed: Optional[float] = 1.0, name: str = "replay"):
+        super().__init__(name)
+        self.redacted = redacted
+        self.speed = speed
+        self.by_key: Dict[str, deque] = defaultdict(deque)
+        self.by_model: Dict[str, deque] = defaultdict(deque)
+        for record in records:
+            self.by_key[record["key"]].append(record)
+            self.by_model[record["model"]].append(record)
+        self._lock = threading.Lock()
+        self.served = 0
+        self.unmatched = 0
+
+    def _take(self, model: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        key = request_key(model, messages, self.redacted)
+        with self._lock:
+            self.served += 1
+            for queue in (self.by_key[key], self.by_model[model]):
+                while queue:
+                    record = queue.popleft()
+                    if not record.get("used"):
+                        record["used"] = True
+                        return record
+            self.unmatched += 1
+        return {"latency": 0.0, "first_token": None, "error": f"No recorded response left for {model}"}
+
+    def _sleep(self, seconds: Optional[float]):
+        if self.speed and seconds:
+            time.sleep(seconds / self.speed)
+
+    def complete(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> AIResponse:
+        record = self._take(model, messages)
+        self._sleep(record["latency"])
+        if "error" in record:
+            raise Exception(record["error"])
+        return AIResponse(record["content"], model, self.name, record.get("tokens_used"), record.get("finish_reason"),
+                          record.get("completion_tokens"))
+
+    def stream(self, model: str, messages: List[Dict], temperature: float, max_tokens: int) -> Generator[str, None, AIResponse]:
+        record = self._take(model, messages)
+        first_token = record["first_token"] if record["first_token"] is not None else record["latency"]
+        self._sleep(first_token)
+        if "error" in record:
+            raise Exception(record["error"])
+        content = record["content"]
+        # Spread the rest of the recorded latency over a few chunks
+        chunks = [content[i:i + 200] for i in range(0, len(content), 200)] or [""]
+        for chunk in chunks:
+            yield chunk
+            self._sleep((record["latency"] - first_token) / len(chunks))
+        return AIResponse(content, model, self.name, record.get("tokens_used"), record.get("finish_reason"),
+                          record.get("completion_tokens"))
+
+    def probe(self):
+        pass